@@ -1,50 +1,160 @@
 import pyalpm
+import re
 from arf.format import print_warning
+from arf.trace import traced
+from collections import defaultdict
+from functools import cache
+from pathlib import Path
 from pycman.config import PacmanConfig
-from re import escape
+
+DEP_PATTERN = re.compile(r"(?P<name>[^<>=]+)(?:(?P<op>[<>]=?|=)(?P<version>.+))?")
+
+
+def parse_dep(dep: str) -> tuple[str, str, str]:
+    match = DEP_PATTERN.fullmatch(dep)
+    if not match:
+        return dep, "", ""
+    return match["name"], match["op"] or "", match["version"] or ""
+
+
+def satisfies(version: str | None, op: str, required: str) -> bool:
+    if not op:
+        return True
+    if not version:
+        return False
+    result = pyalpm.vercmp(version, required)
+    return {
+        "=": result == 0,
+        "<": result < 0,
+        "<=": result <= 0,
+        ">": result > 0,
+        ">=": result >= 0,
+    }[op]
+
+
+class LocalSnapshot:
+    def __init__(self, localdb):
+        self.packages = {pkg.name: pkg for pkg in localdb.pkgcache}
+
+        provides = defaultdict(list)
+        for pkg in self.packages.values():
+            for provide in pkg.provides:
+                name, _, version = parse_dep(provide)
+                provides[name].append((pkg.name, version))
+        self.provides = dict(provides)
+
+        # Same relation as compute_requiredby/compute_optionalfor, for every package at once
+        self.required_by = defaultdict(set)
+        self.optional_for = defaultdict(set)
+        for pkg in self.packages.values():
+            for dep in pkg.depends:
+                for name in self.satisfiers(dep):
+                    self.required_by[name].add(pkg.name)
+            for dep in pkg.optdepends:
+                for name in self.satisfiers(dep.split(":", 1)[0]):
+                    self.optional_for[name].add(pkg.name)
+
+    def satisfiers(self, dep: str) -> set[str]:
+        name, op, required = parse_dep(dep)
+        found = {
+            pkg_name
+            for pkg_name, version in self.provides.get(name, ())
+            if satisfies(version, op, required)
+        }
+        if (pkg := self.packages.get(name)) and satisfies(pkg.version, op, required):
+            found.add(name)
+        return found
 
 
 class Alpm:
+    @traced("alpm")
     def __init__(self, conf="/etc/pacman.conf"):
         self.handle = PacmanConfig(conf).initialize_alpm()
         self.localdb = self.handle.get_localdb()
         self.syncdbs = self.handle.get_syncdbs()
+        self._provides = {}
+        self._provides_stamp = None
+        self._local = None
+        self._sync_names = None
+
+    def _sync_stamp(self) -> tuple:
+        sync_dir = Path(self.handle.dbpath) / "sync"
+        stamp = []
+        for db in self.syncdbs:
+            try:
+                stamp.append((db.name, (sync_dir / f"{db.name}.db").stat().st_mtime_ns))
+            except OSError:
+                stamp.append((db.name, None))
+        return tuple(stamp)
+
+    @traced("alpm")
+    def provides_index(self) -> dict[str, list[tuple[str, str]]]:
+        stamp = self._sync_stamp()
+        if stamp != self._provides_stamp:
+            index = defaultdict(list)
+            for db in self.syncdbs:
+                for pkg in db.pkgcache:
+                    for provide in pkg.provides:
+                        name, _, version = parse_dep(provide)
+                        index[name].append((pkg.name, version))
+            self._provides = dict(index)
+            self._provides_stamp = stamp
+        return self._provides
 
+    @property
+    def local(self) -> LocalSnapshot:
+        if self._local is None:
+            self._local = LocalSnapshot(self.localdb)
+        return self._local
+
+    def ignore_repo(self, name: str) -> None:
+        self.syncdbs = [db for db in self.syncdbs if db.name != name]
+        self._provides_stamp = None
+        self._sync_names = None
+
+    @traced("alpm")
     def is_installed(self, package: str) -> bool:
-        pattern = f"^{escape(package)}$"
-        return bool(self.localdb.search(pattern))
+        return bool(self.local.satisfiers(package))
 
+    @traced("alpm")
     def all_sync_packages(self) -> set[str]:
-        return {pkg.name for db in self.syncdbs for pkg in db.pkgcache}
+        if self._sync_names is None:
+            self._sync_names = {pkg.name for db in self.syncdbs for pkg in db.pkgcache}
+        return self._sync_names
 
+    @traced("alpm")
     def explicit_not_required(self) -> set[str]:
         return {
-            pkg.name
-            for pkg in self.localdb.pkgcache
-            if pkg.reason == pyalpm.PKG_REASON_EXPLICIT and not pkg.compute_requiredby()
+            name
+            for name, pkg in self.local.packages.items()
+            if pkg.reason == pyalpm.PKG_REASON_EXPLICIT and not self.local.required_by[name]
         }
 
+    @traced("alpm")
     def foreign_packages(self) -> set[str]:
         sync_packages = self.all_sync_packages()
-        return {pkg.name for pkg in self.localdb.pkgcache if pkg.name not in sync_packages}
+        return {name for name in self.local.packages if name not in sync_packages}
 
+    @traced("alpm")
     def orphans(self) -> set[str]:
         return {
-            pkg.name
-            for pkg in self.localdb.pkgcache
+            name
+            for name, pkg in self.local.packages.items()
             if pkg.reason == pyalpm.PKG_REASON_DEPEND
-            and not pkg.compute_requiredby()
-            and not pkg.compute_optionalfor()
+            and not self.local.required_by[name]
+            and not self.local.optional_for[name]
         }
 
-    def get_providers(self, name: str) -> set[str]:
+    @traced("alpm")
+    def get_providers(self, dep: str) -> set[str]:
+        name, op, required = parse_dep(dep)
         return {
-            pkg.name
-            for db in self.syncdbs
-            for pkg in db.search(name)
-            if any(p.split("=")[0] == name for p in pkg.provides)
+            pkg_name
+            for pkg_name, version in self.provides_index().get(name, ())
+            if satisfies(version, op, required)
         }
 
+    @traced("alpm")
     def get_group(self, name: str) -> set[str] | None:
         for db in self.syncdbs:
             if group := db.read_grp(name):
@@ -53,11 +163,18 @@ class Alpm:
         print_warning(f"Group {name} not found.")
         return None
 
+    @traced("alpm")
     def get_sync_package(self, name: str):
         for db in self.syncdbs:
             if pkg := db.get_pkg(name):
                 return pkg
         return None
 
+    @traced("alpm")
     def get_local_package(self, name: str):
-        return self.localdb.get_pkg(name)
+        return self.local.packages.get(name)
+
+
+@cache
+def get_alpm() -> Alpm:
+    return Alpm()
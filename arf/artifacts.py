@@ -0,0 +1,102 @@
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+from arf.config import ARTIFACT_CACHE_SIZE, ARTIFACT_DIR
+from pathlib import Path
+
+# makepkg's VCS protocols, whose sources follow a branch rather than a fixed revision
+VCS_PROTOCOLS = {"bzr", "fossil", "git", "hg", "svn"}
+
+
+def has_vcs_sources(srcinfo: dict) -> bool:
+    for entry in srcinfo.get("source", []):
+        location = entry.partition("::")[2] or entry
+        # git+https://..., svn://..., hg+ssh://..., bzr+lp:...
+        protocol, sep, _ = location.partition("://")
+        if not sep:
+            protocol, sep, _ = location.partition("+lp:")
+        if sep and protocol.split("+", 1)[0] in VCS_PROTOCOLS:
+            return True
+    return False
+
+
+def cache_key(repo: Path, flags: list[str]) -> str:
+    head = subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    # PKGBUILDs edited during review must not hit the cache of the pristine commit
+    local_changes = subprocess.run(
+        ["git", "diff", "HEAD"], cwd=repo, capture_output=True, check=True
+    ).stdout
+    digest = hashlib.sha256()
+    for part in (
+        head.encode(),
+        local_changes,
+        "\0".join(flags).encode(),
+        platform.machine().encode(),
+    ):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def lookup(key: str, archives: list[str]) -> list[str] | None:
+    entry = ARTIFACT_DIR / key
+    cached = [entry / Path(archive).name for archive in archives]
+    if not archives or not all(path.is_file() for path in cached):
+        return None
+    # The directory mtime records when the entry was last used, for LRU eviction
+    os.utime(entry)
+    return [str(path) for path in cached]
+
+
+def place(source: Path, target: Path) -> None:
+    staging = target.with_name(f".{target.name}.tmp")
+    staging.unlink(missing_ok=True)
+    # A hard link costs nothing when both sides share a filesystem
+    try:
+        os.link(source, staging)
+    except OSError:
+        shutil.copy2(source, staging)
+    os.replace(staging, target)
+
+
+def store(key: str, archives: list[str]) -> None:
+    entry = ARTIFACT_DIR / key
+    if entry.is_dir():
+        shutil.rmtree(entry)
+    ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=ARTIFACT_DIR))
+    for archive in map(Path, archives):
+        place(archive, staging / archive.name)
+    try:
+        staging.rename(entry)
+    except OSError:
+        # Another host sharing the volume stored the same build first
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def entry_size(entry: Path) -> int:
+    return sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+
+
+def evict(limit: int = ARTIFACT_CACHE_SIZE) -> int:
+    if not ARTIFACT_DIR.is_dir():
+        return 0
+    entries = sorted(
+        (e for e in ARTIFACT_DIR.iterdir() if e.is_dir() and not e.name.startswith(".")),
+        key=lambda e: e.stat().st_mtime,
+        reverse=True,
+    )
+    used = freed = 0
+    for entry in entries:
+        size = entry_size(entry)
+        if used + size <= limit:
+            used += size
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        freed += size
+    return freed
@@ -0,0 +1,141 @@
+import subprocess
+from arf import artifacts, trace, vcs
+from arf.config import EXCLUDE_PACKAGE_PATTERN, LOCAL_REPO, LOCAL_REPO_NAME
+from arf.exceptions import BuildError
+from arf.fetch import get_repo, prefetch_repos
+from arf.format import print_step, print_warning
+from arf.process import run_command, run_pacman
+from arf.srcinfo_cache import read_srcinfo
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def get_pkg_archives(repo):
+    proc = subprocess.run(
+        ["makepkg", "--packagelist"], text=True, capture_output=True, cwd=str(repo)
+    )
+    packages = proc.stdout.strip().splitlines()
+    return [pkg for pkg in packages if not EXCLUDE_PACKAGE_PATTERN.match(pkg)]
+
+
+def archive_parts(archive: str) -> list[str]:
+    # <pkgname>-<pkgver>-<pkgrel>-<arch>.pkg.tar.*
+    return Path(archive).name.removesuffix(".sig").rsplit("-", 3)
+
+
+def archive_pkgname(archive: str) -> str:
+    return archive_parts(archive)[0]
+
+
+def publish_archives(archives: list[str]) -> None:
+    LOCAL_REPO.mkdir(parents=True, exist_ok=True)
+    published = []
+    for archive in map(Path, archives):
+        if not archive.exists():
+            print_warning(f"{archive.name} was not built, not publishing it")
+            continue
+        for source in (archive, archive.with_name(archive.name + ".sig")):
+            if not source.exists():
+                continue
+            artifacts.place(source, LOCAL_REPO / source.name)
+        published.append(LOCAL_REPO / archive.name)
+    if not published:
+        return
+
+    run_command(
+        ["repo-add", "-q", str(LOCAL_REPO / f"{LOCAL_REPO_NAME}.db.tar.gz"), *map(str, published)]
+    )
+
+    # Drop superseded versions so the repo does not grow with every rebuild
+    names = {archive_pkgname(path.name): path.name for path in published}
+    for path in LOCAL_REPO.glob("*.pkg.tar.*"):
+        filename = path.name.removesuffix(".sig")
+        pkgname = archive_pkgname(filename)
+        if pkgname in names and names[pkgname] != filename:
+            path.unlink(missing_ok=True)
+
+
+def build_layers(aur: list[dict], graph: dict[str, set[str]]) -> list[list[dict]]:
+    names = {pkg["name"] for pkg in aur}
+    depth = {}
+    layers = []
+    # aur is topologically sorted, so every dependency already has a depth
+    for pkg in aur:
+        deps = (depth.get(dep, -1) for dep in graph.get(pkg["name"], ()) if dep in names)
+        depth[pkg["name"]] = level = max(deps, default=-1) + 1
+        if level == len(layers):
+            layers.append([])
+        layers[level].append(pkg)
+    return layers
+
+
+def build_package(name: str, flags: list[str], quiet: bool = False) -> list[str]:
+    repo = get_repo(name)
+    srcinfo = read_srcinfo(name, repo)
+    sources = vcs.git_sources(srcinfo)
+    # Upstream heads of VCS sources are not part of the key, so those builds are never reused
+    key = None if artifacts.has_vcs_sources(srcinfo) else artifacts.cache_key(repo, flags)
+    if key and (cached := artifacts.lookup(key, get_pkg_archives(repo))):
+        print(f"Using cached build of {name}")
+        return cached
+
+    if not quiet:
+        run_command(["makepkg", *flags], cwd=repo)
+    else:
+        log_path = repo / "build.log"
+        with log_path.open("w") as log, trace.span("build", f"makepkg {name}"):
+            proc = subprocess.run(
+                ["makepkg", *flags],
+                cwd=repo,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        if proc.returncode != 0:
+            raise BuildError(name, log_path)
+
+    archives = get_pkg_archives(repo)
+    if key:
+        artifacts.store(key, archives)
+    if sources:
+        vcs.record(name, repo, sources)
+    return archives
+
+
+def build_and_install(
+    aur: list[dict], graph: dict[str, set[str]], flags: list[str], jobs: int, publish: bool = False
+):
+    prefetch_repos(pkg["name"] for pkg in aur)
+    total = len(aur)
+    done = 0
+    for layer in build_layers(aur, graph):
+        if jobs > 1 and len(layer) > 1:
+            names = " ".join(pkg["name"] for pkg in layer)
+            print_step(
+                f"Building AUR packages ({done + 1}-{done + len(layer)}/{total}): {names}",
+                pad=True,
+            )
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(build_package, pkg["name"], flags, True) for pkg in layer]
+            archives = [future.result() for future in futures]
+        else:
+            archives = []
+            for i, pkg in enumerate(layer, start=done + 1):
+                print_step(f"Building AUR package: {pkg['name']} ({i}/{total})", pad=True)
+                archives.append(build_package(pkg["name"], flags))
+        done += len(layer)
+
+        if publish:
+            print_step(f"Publishing to {LOCAL_REPO}...")
+            publish_archives([archive for pkg_archives in archives for archive in pkg_archives])
+
+        # Later layers need this one installed before they can build
+        run_pacman(["-U", *(archive for pkg_archives in archives for archive in pkg_archives)])
+        deps = [
+            archive_pkgname(archive)
+            for pkg, pkg_archives in zip(layer, archives)
+            if pkg["dependency"]
+            for archive in pkg_archives
+        ]
+        if deps:
+            run_pacman(["-Dq", "--asdeps", *deps])
@@ -0,0 +1,153 @@
+import fcntl
+import os
+import shutil
+import subprocess
+import time
+from arf.build import archive_parts
+from arf.config import ARF_CACHE, CACHE_BUDGETS, FETCH_JOBS, PKGS_DIR
+from arf.fetch import unshare_repo
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+LOCK_PATH = ARF_CACHE / "lock"
+BUILD_TREES = ("src", "pkg", "build.log")
+
+LABELS = {
+    "repos": "PKGBUILD directories of removed packages",
+    "build": "makepkg build trees",
+    "archives": "built package archives",
+    "sources": "downloaded sources",
+}
+
+
+class Item(NamedTuple):
+    category: str
+    path: Path
+    size: int
+    mtime: float
+
+
+@contextmanager
+def cache_lock(exclusive: bool = False):
+    # Commands share the cache, clean takes it alone so it never deletes from under a build
+    ARF_CACHE.mkdir(parents=True, exist_ok=True)
+    with LOCK_PATH.open("a") as f:
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(f, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("Waiting for another arf process to release the cache...")
+            fcntl.flock(f, mode)
+        yield
+
+
+def disk_usage(path: Path) -> int:
+    if not path.is_dir() or path.is_symlink():
+        return path.lstat().st_size
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files + dirs:
+            total += os.lstat(os.path.join(root, name)).st_size
+    return total
+
+
+def classify(repo: Path) -> list[tuple[str, Path]]:
+    # Everything git does not track was produced by makepkg
+    proc = subprocess.run(
+        ["git", "ls-files", "-z", "--others", "--directory"],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return []
+    # git does not list empty directories, makepkg leaves those behind too
+    entries = [("build", repo / name) for name in BUILD_TREES if (repo / name).exists()]
+    for entry in filter(None, proc.stdout.split("\0")):
+        path = repo / entry.rstrip("/")
+        if entry.split("/", 1)[0].rstrip("/") in BUILD_TREES:
+            continue
+        if ".pkg.tar." in path.name:
+            entries.append(("archives", path))
+        else:
+            entries.append(("sources", path))
+    return entries
+
+
+def installed_archive(path: Path, alpm) -> bool:
+    parts = archive_parts(path.name)
+    if len(parts) != 4:
+        return False
+    name, version, release, _ = parts
+    pkg = alpm.get_local_package(name)
+    return pkg is not None and pkg.version == f"{version}-{release}"
+
+
+def measure(category: str, path: Path) -> Item | None:
+    try:
+        return Item(category, path, disk_usage(path), path.lstat().st_mtime)
+    except FileNotFoundError:
+        return None
+
+
+def collect(foreign: set[str], alpm) -> list[Item]:
+    if not PKGS_DIR.is_dir():
+        return []
+    repos = [d for d in PKGS_DIR.iterdir() if d.is_dir()]
+    entries = [("repos", d) for d in repos if d.name not in foreign]
+    with ThreadPoolExecutor(max_workers=FETCH_JOBS) as pool:
+        for found in pool.map(classify, [d for d in repos if d.name in foreign]):
+            entries += [
+                (category, path)
+                for category, path in found
+                if category != "archives" or not installed_archive(path, alpm)
+            ]
+        return [item for item in pool.map(lambda e: measure(*e), entries) if item]
+
+
+def select(items: list[Item], now: float) -> list[Item]:
+    doomed = []
+    for category in {item.category for item in items}:
+        max_size, max_age = CACHE_BUDGETS.get(category, (None, None))
+        kept = 0
+        # Newest first, so the oldest entries are the ones pushed over the size budget
+        for item in sorted(
+            (i for i in items if i.category == category), key=lambda i: i.mtime, reverse=True
+        ):
+            too_old = max_age is not None and now - item.mtime > max_age
+            # A zero budget also covers empty entries
+            too_big = max_size is not None and (max_size == 0 or kept + item.size > max_size)
+            if too_old or too_big:
+                doomed.append(item)
+            else:
+                kept += item.size
+    return doomed
+
+
+def remove(item: Item) -> None:
+    if item.path.is_dir() and not item.path.is_symlink():
+        shutil.rmtree(item.path)
+    else:
+        item.path.unlink(missing_ok=True)
+
+
+def collect_garbage(foreign: set[str], alpm) -> tuple[dict[str, tuple[int, int]], list[str]]:
+    doomed = select(collect(foreign, alpm), time.time())
+    freed = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=FETCH_JOBS) as pool:
+        futures = [(item, pool.submit(remove, item)) for item in doomed]
+    for item, future in futures:
+        try:
+            future.result()
+        except OSError as e:
+            errors.append(str(e))
+            continue
+        if item.category == "repos":
+            # Ref updates in the shared store would contend for its lock if run in parallel
+            unshare_repo(item.path.name)
+        count, size = freed.get(item.category, (0, 0))
+        freed[item.category] = (count + 1, size + item.size)
+    return freed, errors
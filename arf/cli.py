@@ -1,14 +1,8 @@
 import sys
-from argparse import ArgumentParser
+from argparse import ArgumentParser, BooleanOptionalAction
+from arf.config import BUILD_JOBS, TRACE
 from arf.exceptions import ArfException, SrcinfoParseError
 from arf.format import print_error, print_srcinfo_errors
-from arf.main import (
-    cmd_install,
-    cmd_update,
-    cmd_remove,
-    cmd_clean,
-    cmd_sync,
-)
 
 
 def add_aur_flags(parser):
@@ -16,10 +10,46 @@ def add_aur_flags(parser):
     group.add_argument("-a", "--aur-only", dest="aur_only", action="store_true")
     group.add_argument("-A", "--no-aur", dest="no_aur", action="store_true")
     parser.add_argument("--mflags", help="A string of flags to pass to makepkg")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=BUILD_JOBS,
+        help="Number of AUR packages to build at once",
+    )
+    parser.add_argument(
+        "--publish",
+        action="store_true",
+        help="Also add the built AUR packages to the local pacman repository",
+    )
+
+
+def add_batch_flags(parser):
+    parser.add_argument(
+        "--noconfirm",
+        action="store_true",
+        help="Run without fzf or prompts, taking the first provider and whole groups",
+    )
+    parser.add_argument(
+        "--answers", metavar="FILE", help="JSON file pinning provider and group choices"
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--plan", metavar="FILE", help="Write the resolved plan as JSON instead of installing"
+    )
+    group.add_argument("--apply", metavar="FILE", help="Install a plan written by --plan")
 
 
 def parse_args():
     parser = ArgumentParser(prog="arf", description="Arf: an fzf Pacman wrapper and AUR helper")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print where the time went (git, network, alpm, build) on exit",
+    )
+    parser.add_argument(
+        "--trace-file", metavar="PATH", help="Also write a Chrome trace-event JSON file"
+    )
     subparsers = parser.add_subparsers(dest="command")
 
     install = subparsers.add_parser(
@@ -29,7 +59,8 @@ def parse_args():
     )
     install.add_argument("packages", nargs="*", help="Packages to install (opens fzf if omitted)")
     add_aur_flags(install)
-    install.set_defaults(func=cmd_install)
+    add_batch_flags(install)
+    install.set_defaults(func="cmd_install")
 
     update = subparsers.add_parser("update", aliases=["u"], help="Update system and AUR packages")
     add_aur_flags(update)
@@ -37,29 +68,53 @@ def parse_args():
         "-d",
         "--devel",
         action="store_true",
-        help="Update all development (-git) packages",
+        help="Update development (-git) packages whose upstream has new commits",
     )
-    update.set_defaults(func=cmd_update)
+    add_batch_flags(update)
+    update.set_defaults(func="cmd_update")
 
     remove = subparsers.add_parser(
         "remove", aliases=["r"], help="Remove packages (interactive if none specified)"
     )
     remove.add_argument("packages", nargs="*", help="Packages to remove (opens fzf if omitted)")
-    remove.set_defaults(func=cmd_remove)
+    remove.set_defaults(func="cmd_remove")
 
     clean = subparsers.add_parser("clean", aliases=["c"], help="Remove orphans and clean cache")
-    clean.set_defaults(func=cmd_clean)
+    clean.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Only clean Arf's cache, without removing orphans (for timers)",
+    )
+    clean.set_defaults(func="cmd_clean")
 
     sync = subparsers.add_parser("sync", aliases=["s"], help="Refresh AUR metadata")
-    sync.set_defaults(func=cmd_sync)
+    sync.add_argument(
+        "--full",
+        action=BooleanOptionalAction,
+        help="Also mirror the full AUR metadata for offline resolution (--no-full drops it)",
+    )
+    sync.set_defaults(func="cmd_sync")
 
-    return parser.parse_args(["install"] if len(sys.argv) == 1 else None)
+    args = parser.parse_args()
+    if args.command is None:
+        args = parser.parse_args([*sys.argv[1:], "install"])
+    return args
 
 
 def main():
     args = parse_args()
+    if args.profile or args.trace_file or TRACE not in ("", "0"):
+        from arf import trace
+
+        # ARF_TRACE=1 only prints the summary, any other value is a trace file path
+        trace.enable(args.trace_file or (TRACE if TRACE != "1" else None))
     try:
-        args.func(args)
+        # Commands pull in pyalpm, requests and srcinfo, so only load them once parsing succeeded
+        from arf import main as commands
+        from arf.cleanup import cache_lock
+
+        with cache_lock(exclusive=args.func == "cmd_clean"):
+            getattr(commands, args.func)(args)
 
     except SrcinfoParseError as e:
         print_error(str(e))
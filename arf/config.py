@@ -3,10 +3,52 @@ import re
 from importlib.resources import files
 from pathlib import Path
 
+
+def parse_size(value: str) -> int:
+    units = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    match = re.fullmatch(r"(\d+)\s*([KMGT]?)i?B?", value.strip(), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(match[1]) * units[match[2].upper()]
+
+
+def parse_budgets(value: str) -> dict[str, tuple[int | None, int | None]]:
+    # category=SIZE[:AGE], AGE in days, e.g. "archives=2G:30d,sources=5G"
+    budgets = {}
+    for entry in filter(None, (e.strip() for e in value.split(","))):
+        category, _, spec = entry.partition("=")
+        size, _, age = spec.partition(":")
+        if age and not (match := re.fullmatch(r"(\d+)\s*d?", age.strip())):
+            raise ValueError(f"Invalid age: {age}")
+        budgets[category.strip()] = (
+            parse_size(size) if size.strip() else None,
+            int(match[1]) * 86400 if age else None,
+        )
+    return budgets
+
+
 ARF_CACHE = Path(environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "arf"
 PKGS_DIR = ARF_CACHE / "pkgbuild"
+AUR_URL = environ.get("ARF_AUR_URL", "https://aur.archlinux.org")
 EDITOR = environ.get("EDITOR", "nano")
 PACMAN_AUTH = environ.get("PACMAN_AUTH", "sudo")
 DEFAULT_FZF_CMD = ["fzf", "--ansi", "--reverse", "--header-first", "--preview-window=75%"]
 PREVIEW_SCRIPTS = files("arf").joinpath("previews")
 EXCLUDE_PACKAGE_PATTERN = re.compile(r".*-(bin-debug.*|debug-.+-any)\.pkg\.tar\.zst")
+FETCH_JOBS = int(environ.get("ARF_FETCH_JOBS", "8"))
+PREVIEW_SERVER = environ.get("ARF_PREVIEW_SERVER", "1") != "0"
+BUILD_JOBS = int(environ.get("ARF_BUILD_JOBS", "1"))
+ARTIFACT_DIR = Path(environ.get("ARF_ARTIFACT_DIR", ARF_CACHE / "artifacts"))
+ARTIFACT_CACHE_SIZE = parse_size(environ.get("ARF_ARTIFACT_CACHE_SIZE", "10G"))
+# One of full, shallow or blobless
+GIT_STORAGE = environ.get("ARF_GIT_STORAGE", "full")
+GIT_OBJECTS = ARF_CACHE / "objects.git"
+# Review diffs computed before fzf opens, read by previews/diff.sh
+DIFF_DIR = ARF_CACHE / "diffs"
+TRACE = environ.get("ARF_TRACE", "")
+# Where --publish puts built packages, served to other hosts as the [LOCAL_REPO_NAME] repo
+LOCAL_REPO = Path(environ.get("ARF_LOCAL_REPO", ARF_CACHE / "repo"))
+LOCAL_REPO_NAME = environ.get("ARF_LOCAL_REPO_NAME", "arf")
+CACHE_BUDGETS = parse_budgets("repos=0,build=0,archives=2G:30d,sources=5G:90d") | parse_budgets(
+    environ.get("ARF_CACHE_BUDGETS", "")
+)
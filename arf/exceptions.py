@@ -26,3 +26,14 @@ class PackageResolutionError(ArfException):
         else:
             message = f"Package not found: {pkg}"
         super().__init__(message)
+
+
+class BuildError(ArfException):
+    def __init__(self, pkg, log_path):
+        self.pkg = pkg
+        self.log_path = log_path
+        super().__init__(f"Failed to build {pkg}, see {log_path}")
+
+
+class PlanError(ArfException):
+    pass
@@ -1,65 +1,277 @@
-import gzip
-import requests
+import codecs
+import json
+import shutil
 import subprocess
-from arf.config import ARF_CACHE, PKGS_DIR
+import threading
+import zlib
+from arf import mirror, trace
+from arf.config import ARF_CACHE, AUR_URL, FETCH_JOBS, GIT_OBJECTS, GIT_STORAGE, PKGS_DIR
 from arf.exceptions import RepoFetchError, RPCError
+from arf.format import print_warning
+from arf.index import PackageIndex, write_index
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import cache
-from io import BytesIO
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-_seen_repos = set()
+if TYPE_CHECKING:
+    import requests
+
+RPC_URI_BUDGET = 4000
+CHUNK_SIZE = 64 * 1024
+
+_requests_in_flight: dict[tuple, Future] = {}
+_requests_lock = threading.Lock()
+_repo_futures: dict[str, Future] = {}
+_repo_lock = threading.Lock()
+_print_lock = threading.Lock()
+
+
+def _http_errors() -> tuple[type[Exception], ...]:
+    import requests
+    import urllib3
+
+    return requests.RequestException, urllib3.exceptions.HTTPError, ValueError
+
+
+@cache
+def session() -> "requests.Session":
+    # requests is slow to import and most invocations never touch the network
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry
+
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(pool_maxsize=FETCH_JOBS, max_retries=retry)
+    http = requests.Session()
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    return http
+
+
+def get_json(path: str, params: dict) -> dict:
+    key = (path, tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items()))
+    with _requests_lock:
+        pending = _requests_in_flight.get(key)
+        if pending is None:
+            _requests_in_flight[key] = future = Future()
+    # Identical concurrent queries wait for the request that is already running
+    if pending is not None:
+        return pending.result()
+
+    try:
+        with trace.span("network", path):
+            response = session().get(f"{AUR_URL}{path}", params=params, timeout=10)
+            response.raise_for_status()
+            future.set_result(response.json())
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _requests_lock:
+            del _requests_in_flight[key]
+    return future.result()
 
 
 def search_rpc(query: str, by: str = "name", type: str = "search") -> list[dict]:
+    if by == "provides" and mirror.enabled():
+        return mirror.providers(query)
     try:
-        response = requests.get(
-            f"https://aur.archlinux.org/rpc/v5/{type}",
-            params={"by": by, "arg": query},
-            timeout=10,
-        )
-        response.raise_for_status()
-        return response.json().get("results", [])
-    except requests.RequestException as e:
+        return get_json(f"/rpc/v5/{type}", {"by": by, "arg": query}).get("results", [])
+    except _http_errors() as e:
         raise RPCError("Unable to search the AUR.") from e
 
 
+def rpc_info(names: Iterable[str]) -> dict[str, dict]:
+    if mirror.enabled():
+        # The mirror holds the whole AUR, a name missing from it does not exist
+        return mirror.info(names)
+    results = {}
+    batch, length = [], 0
+    for name in names:
+        # Stay well below the AUR's request URI limit
+        if batch and length + len(name) > RPC_URI_BUDGET:
+            results.update(_rpc_info_batch(batch))
+            batch, length = [], 0
+        batch.append(name)
+        length += len(name) + len("&arg%5B%5D=")
+    if batch:
+        results.update(_rpc_info_batch(batch))
+    return results
+
+
+def _rpc_info_batch(names: list[str]) -> dict[str, dict]:
+    try:
+        results = get_json("/rpc/v5/info", {"arg[]": names}).get("results", [])
+    except _http_errors() as e:
+        raise RPCError("Unable to query the AUR.") from e
+    return {pkg["Name"]: pkg for pkg in results}
+
+
+def _gzip_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    pending = b""
+    for chunk in chunks:
+        *lines, pending = (pending + decoder.decompress(chunk)).split(b"\n")
+        yield from (line.decode() for line in lines)
+    yield from (line.decode() for line in (pending + decoder.flush()).split(b"\n"))
+
+
 def download_package_list(force: bool = False) -> Path:
-    file_path = Path(ARF_CACHE / "packages.txt")
-    if not file_path.exists() or force:
-        ARF_CACHE.mkdir(parents=True, exist_ok=True)
-        print("Downloading AUR package list...")
-        try:
-            response = requests.get("https://aur.archlinux.org/packages.gz", timeout=10)
-            response.raise_for_status()
-        except requests.RequestException:
-            raise RPCError("Failed to download AUR package list.")
+    file_path = ARF_CACHE / "packages.idx"
+    meta_path = ARF_CACHE / "packages.json"
+    if file_path.exists() and not force:
+        return file_path
+
+    ARF_CACHE.mkdir(parents=True, exist_ok=True)
+    headers = {}
+    if file_path.exists() and meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if etag := meta.get("etag"):
+            headers["If-None-Match"] = etag
+        if modified := meta.get("last_modified"):
+            headers["If-Modified-Since"] = modified
 
-        with gzip.open(BytesIO(response.content), "rt") as gz, file_path.open("w") as f:
-            for line in gz:
-                f.write(line)
+    print("Downloading AUR package list...")
+    try:
+        with (
+            trace.span("network", "/packages.gz"),
+            session().get(
+                f"{AUR_URL}/packages.gz", headers=headers, stream=True, timeout=10
+            ) as response,
+        ):
+            response.raise_for_status()
+            if response.status_code == 304:
+                print("AUR package list is up to date.")
+                file_path.touch()
+                return file_path
+            # The index is only swapped in once the whole body has been decoded
+            write_index(
+                file_path, _gzip_lines(response.raw.stream(CHUNK_SIZE, decode_content=False))
+            )
+            meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+    except (*_http_errors(), zlib.error, EOFError) as e:
+        raise RPCError("Failed to download AUR package list.") from e
 
+    meta_path.write_text(json.dumps(meta))
+    (ARF_CACHE / "packages.txt").unlink(missing_ok=True)
     return file_path
 
 
+def _json_array(chunks: Iterable[bytes]) -> Iterator[dict]:
+    zlib_decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    separators = " \t\r\n,[]"
+    buffer = ""
+    for chunk in chunks:
+        buffer += text_decoder.decode(zlib_decoder.decompress(chunk))
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in separators:
+                pos += 1
+            try:
+                item, pos = json_decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # The rest of the object is still in flight
+                break
+            yield item
+        buffer = buffer[pos:]
+    buffer += text_decoder.decode(zlib_decoder.flush(), final=True)
+    # A body cut between two records leaves nothing over, only zlib knows it ended early
+    if buffer.strip(separators) or not zlib_decoder.eof:
+        raise ValueError("Truncated AUR metadata dump")
+
+
+def download_metadata() -> None:
+    headers = {}
+    if etag := mirror.meta().get("etag"):
+        headers["If-None-Match"] = etag
+
+    print("Downloading AUR metadata...")
+    try:
+        with (
+            trace.span("network", "/packages-meta-ext-v1.json.gz"),
+            session().get(
+                f"{AUR_URL}/packages-meta-ext-v1.json.gz", headers=headers, stream=True, timeout=30
+            ) as response,
+        ):
+            response.raise_for_status()
+            if response.status_code == 304:
+                print("AUR metadata is up to date.")
+                return
+            # Records are parsed as they arrive rather than loading the whole dump
+            count = mirror.replace(
+                _json_array(response.raw.stream(CHUNK_SIZE, decode_content=False)),
+                {"etag": response.headers.get("ETag")},
+            )
+    except (*_http_errors(), zlib.error) as e:
+        raise RPCError("Failed to download AUR metadata.") from e
+    print(f"Indexed {count} AUR packages.")
+
+
 @cache
-def package_list() -> set[str]:
-    file_path = download_package_list()
-    if not file_path or not file_path.exists():
-        return set()
-    with open(file_path, "r") as f:
-        return {line.strip() for line in f}
+def package_list() -> PackageIndex:
+    return PackageIndex(download_package_list())
 
 
-def get_repo(pkg_name: str) -> Path:
-    repo = PKGS_DIR / pkg_name
+def _log(message: str) -> None:
+    with _print_lock:
+        print(message, flush=True)
+
+
+@cache
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=FETCH_JOBS, thread_name_prefix="arf-fetch")
+
+
+def _git(args: list[str], cwd: Path, quiet: bool = False, capture: bool = False) -> str:
+    cmd = ["git", *args]
+    with trace.command_span(cmd):
+        proc = subprocess.run(
+            cmd,
+            cwd=cwd,
+            check=True,
+            text=True,
+            stdout=subprocess.PIPE if capture else None,
+            stderr=subprocess.DEVNULL if quiet else None,
+        )
+    return proc.stdout or ""
+
 
-    if pkg_name in _seen_repos:
-        return repo
+def _history_args(since: int | None) -> list[str]:
+    if GIT_STORAGE == "blobless":
+        return ["--filter=blob:none"]
+    if GIT_STORAGE == "shallow":
+        return [f"--shallow-since={since}"] if since else ["--depth=1"]
+    return []
+
+
+def _fetch_repo(pkg_name: str, since: int | None = None) -> Path:
+    repo = PKGS_DIR / pkg_name
 
     if repo.is_dir():
-        print(f"Pulling {pkg_name}...")
+        _log(f"Pulling {pkg_name}...")
+        fetch_args = ["fetch", "-q", *_history_args(since), "origin", "HEAD"]
         try:
-            subprocess.run(["git", "pull", "-q", "--ff-only"], cwd=repo, check=True)
+            try:
+                _git(fetch_args, repo, quiet=bool(since))
+            except subprocess.CalledProcessError:
+                if not since:
+                    raise
+                # No commits since the installed build, the tip alone is enough
+                since = None
+                _git(["fetch", "-q", "--depth=1", "origin", "HEAD"], repo)
+            # Unlike pull --ff-only, this cannot fail on a diverged or edited checkout
+            _git(["reset", "-q", "--hard", "FETCH_HEAD"], repo)
         except subprocess.CalledProcessError as e:
             raise RepoFetchError(f"Could not pull {pkg_name} from the AUR.") from e
     else:
@@ -67,15 +279,102 @@ def get_repo(pkg_name: str) -> Path:
         if pkg_name not in package_list():
             raise RepoFetchError(f"{pkg_name} is not an AUR package.")
 
-        print(f"Cloning {pkg_name}...")
+        _log(f"Cloning {pkg_name}...")
+        clone = ["clone", "-q", f"{AUR_URL}/{pkg_name}.git"]
+        if (GIT_OBJECTS / "objects").is_dir():
+            clone += ["--reference-if-able", str(GIT_OBJECTS)]
         try:
-            subprocess.run(
-                ["git", "clone", "-q", f"https://aur.archlinux.org/{pkg_name}.git"],
-                cwd=PKGS_DIR,
-                check=True,
-            )
+            try:
+                _git([*clone, *_history_args(since)], PKGS_DIR, quiet=bool(since))
+            except subprocess.CalledProcessError:
+                if not since:
+                    raise
+                since = None
+                shutil.rmtree(repo, ignore_errors=True)
+                _git([*clone, "--depth=1"], PKGS_DIR)
         except subprocess.CalledProcessError as e:
             raise RepoFetchError(f"Could not clone {pkg_name} from the AUR.") from e
 
-    _seen_repos.add(pkg_name)
+    if since:
+        # arf.review diffs against the last commit from before the installed build date
+        try:
+            before = _git(["log", "-1", f"--before={since}", "--format=%H"], repo, capture=True)
+            if not before.strip():
+                _git(["fetch", "-q", "--deepen=1", "origin"], repo)
+        except subprocess.CalledProcessError as e:
+            raise RepoFetchError(f"Could not deepen the history of {pkg_name}.") from e
+
     return repo
+
+
+def _installed_build_date(pkg_name: str) -> int | None:
+    if GIT_STORAGE != "shallow":
+        return None
+    from arf.alpm import get_alpm
+
+    pkg = get_alpm().get_local_package(pkg_name)
+    return pkg.builddate if pkg else None
+
+
+def prefetch_repos(pkg_names: Iterable[str]) -> None:
+    # Package list must be loaded before the workers race to read it
+    package_list()
+    with _repo_lock:
+        for name in pkg_names:
+            if name not in _repo_futures:
+                since = _installed_build_date(name)
+                _repo_futures[name] = _executor().submit(_fetch_repo, name, since)
+
+
+def get_repo(pkg_name: str) -> Path:
+    prefetch_repos([pkg_name])
+    # Time spent blocked on a clone or pull, on top of the git spans in the workers
+    with trace.span("repo wait", pkg_name):
+        return _repo_futures[pkg_name].result()
+
+
+def pin_repo(pkg_name: str, commit: str) -> Path:
+    repo = get_repo(pkg_name)
+    try:
+        _git(["reset", "-q", "--hard", commit], repo, quiet=True)
+    except subprocess.CalledProcessError as e:
+        raise RepoFetchError(f"{pkg_name} does not have the planned commit {commit}.") from e
+    return repo
+
+
+def share_objects() -> None:
+    if not PKGS_DIR.is_dir():
+        return
+    if not GIT_OBJECTS.is_dir():
+        _git(["init", "-q", "--bare", str(GIT_OBJECTS)], ARF_CACHE)
+
+    for repo in PKGS_DIR.iterdir():
+        git_dir = repo / ".git"
+        if not git_dir.is_dir():
+            continue
+        cmd = ["git", "config", "remote.origin.promisor"]
+        with trace.command_span(cmd):
+            promisor = subprocess.run(cmd, cwd=repo, capture_output=True)
+        # Partial clones would have to fetch every missing blob to be copied
+        if promisor.returncode == 0:
+            continue
+        try:
+            # The ref keeps the package's objects alive in the shared store
+            _git(
+                ["fetch", "-q", "--update-shallow", str(repo), f"+HEAD:refs/arf/{repo.name}"],
+                GIT_OBJECTS,
+            )
+            alternates = git_dir / "objects" / "info" / "alternates"
+            alternates.parent.mkdir(parents=True, exist_ok=True)
+            alternates.write_text(f"{GIT_OBJECTS / 'objects'}\n")
+            _git(["repack", "-a", "-d", "-l", "-q"], repo)
+        except subprocess.CalledProcessError:
+            print_warning(f"Could not move the git objects of {repo.name} to the shared store")
+
+
+def unshare_repo(pkg_name: str) -> None:
+    if GIT_OBJECTS.is_dir():
+        # Fails harmlessly for repos that were never moved to the shared store
+        cmd = ["git", "update-ref", "-d", f"refs/arf/{pkg_name}"]
+        with trace.command_span(cmd):
+            subprocess.run(cmd, cwd=GIT_OBJECTS, capture_output=True)
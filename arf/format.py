@@ -15,6 +15,14 @@ class Colors:
     DEFAULT = "\x1b[39m"
 
 
+def format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.2f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GiB"
+
+
 def print_step(message: str, pad: bool = False):
     formatted = f"{Colors.BOLD}{Colors.BLUE}:: {Colors.DEFAULT}{message}{Colors.RESET}"
     if pad:
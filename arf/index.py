@@ -0,0 +1,76 @@
+import mmap
+import os
+from arf.format import Colors
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+
+def _replace(path: Path, lines: Iterable[bytes]) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with tmp.open("wb") as f:
+        f.writelines(lines)
+    os.replace(tmp, path)
+
+
+def write_index(path: Path, names: Iterable[str]) -> None:
+    # Byte order, so lookups can compare raw slices of the mapped file
+    entries = sorted({name.strip().encode() for name in names} - {b""})
+    dim, reset = Colors.DIM.encode(), Colors.RESET.encode()
+    _replace(fzf_path(path), (dim + e + reset + b"\n" for e in entries))
+    _replace(path, (e + b"\n" for e in entries))
+
+
+def fzf_path(path: Path) -> Path:
+    return path.with_suffix(".fzf")
+
+
+class PackageIndex:
+    def __init__(self, path: Path):
+        self.path = path
+        with path.open("rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b""
+
+    def _seek(self, key: bytes) -> int:
+        data = self._data
+        lo, hi = 0, len(data)
+        while lo < hi:
+            start = data.rfind(b"\n", lo, (lo + hi) // 2) + 1 or lo
+            end = data.find(b"\n", start, hi)
+            if data[start:end] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def __contains__(self, name: str) -> bool:
+        key = name.encode()
+        pos = self._seek(key)
+        return self._data[pos : pos + len(key) + 1] == key + b"\n"
+
+    def around(self, name: str, before: int, after: int) -> list[str]:
+        data = self._data
+        key = name.encode()
+        start = end = self._seek(key)
+        # The name's own row counts toward neither side
+        if data[end : end + len(key) + 1] == key + b"\n":
+            end += len(key) + 1
+        for _ in range(before):
+            if start == 0:
+                break
+            start = data.rfind(b"\n", 0, start - 1) + 1
+        for _ in range(after):
+            if (end := data.find(b"\n", end) + 1) == 0:
+                end = len(data)
+                break
+        return data[start:end].decode().splitlines()
+
+    def __iter__(self) -> Iterator[str]:
+        return self.fzf_lines(dim=False)
+
+    def fzf_lines(self, dim: bool = True) -> Iterator[str]:
+        with (fzf_path(self.path) if dim else self.path).open("r") as f:
+            for line in f:
+                yield line.rstrip("\n")
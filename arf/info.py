@@ -1,17 +1,33 @@
 import json
 import os
+import shutil
 import sys
 import textwrap
+import threading
 import time
+from arf import store
 from arf.config import ARF_CACHE
-from arf.fetch import search_rpc, RPCError
+from arf.exceptions import ArfException
+from arf.fetch import rpc_info
 from arf.format import Colors, print_error
-from datetime import datetime, timedelta
+from collections import deque
+from collections.abc import Iterable
+from datetime import timedelta
 
 CACHE_TTL = timedelta(days=1)
 COLUMNS = int(os.environ.get("FZF_PREVIEW_COLUMNS", "80"))
+PREFETCH_BATCH = 100
 
-INFO_DIR = ARF_CACHE / "info"
+# Superseded by the info table, only kept so sync can remove it
+LEGACY_INFO_DIR = ARF_CACHE / "info"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    fetched REAL NOT NULL
+);
+"""
 
 FIELDS = [
     ("PackageBase", "Package Base"),
@@ -35,17 +51,52 @@ FIELDS = [
 FIELD_KEYS = {k for k, _ in FIELDS}
 
 
-def cache_is_fresh(path):
-    return (
-        path.is_file() and datetime.now() - datetime.fromtimestamp(path.stat().st_mtime) < CACHE_TTL
+def _db():
+    return store.connect(SCHEMA)
+
+
+def cached_info(pkg: str) -> dict | None:
+    row = (
+        _db()
+        .execute(
+            "SELECT data FROM info WHERE name = ? AND fetched > ?",
+            (pkg, time.time() - CACHE_TTL.total_seconds()),
+        )
+        .fetchone()
     )
+    return json.loads(row[0]) if row else None
+
+
+def stale(names: Iterable[str]) -> list[str]:
+    names = list(names)
+    fresh = set()
+    cutoff = time.time() - CACHE_TTL.total_seconds()
+    for i in range(0, len(names), 500):
+        batch = names[i : i + 500]
+        rows = _db().execute(
+            f"SELECT name FROM info WHERE fetched > ? AND name IN ({','.join('?' * len(batch))})",
+            (cutoff, *batch),
+        )
+        fresh.update(name for (name,) in rows)
+    return [name for name in names if name not in fresh]
+
 
+def prune() -> int:
+    cutoff = time.time() - CACHE_TTL.total_seconds()
+    shutil.rmtree(LEGACY_INFO_DIR, ignore_errors=True)
+    return _db().execute("DELETE FROM info WHERE fetched <= ?", (cutoff,)).rowcount
 
-def wrap_print(label, value):
+
+def clear_cache():
+    _db().execute("DELETE FROM info")
+    shutil.rmtree(LEGACY_INFO_DIR, ignore_errors=True)
+
+
+def wrap_line(label, value, columns=COLUMNS):
     indent = 18
     label_width = indent - 3
-    print(f"{Colors.BOLD}{label:<{label_width}}{Colors.RESET} : ", end="")
-    print(textwrap.fill(value, width=COLUMNS - indent, subsequent_indent=" " * indent))
+    wrapped = textwrap.fill(value, width=columns - indent, subsequent_indent=" " * indent)
+    return f"{Colors.BOLD}{label:<{label_width}}{Colors.RESET} : {wrapped}\n"
 
 
 def normalize(value):
@@ -58,18 +109,8 @@ def format_timestamp(ts):
     return time.strftime("%c", time.localtime(ts)) if ts else None
 
 
-def write_json(pkg, file):
-    try:
-        data = search_rpc(pkg, type="info")
-    except RPCError as e:
-        print_error(str(e))
-        exit(1)
-
-    if len(data) < 1:
-        print_error(f"No package information found for {pkg}.")
-        exit(1)
-
-    data = {k: normalize(v) for k, v in data[0].items()}
+def format_info(data: dict) -> dict:
+    data = {k: normalize(v) for k, v in data.items()}
 
     for key in ("FirstSubmitted", "LastModified"):
         data[key] = format_timestamp(data.get(key))
@@ -81,20 +122,66 @@ def write_json(pkg, file):
     if not data.get("Maintainer"):
         data["Maintainer"] = f"{Colors.RED}Orphan{Colors.RESET}"
 
-    filtered = {k: data[k] for k in FIELD_KEYS if data.get(k) is not None}
-    INFO_DIR.mkdir(parents=True, exist_ok=True)
-    file.write_text(json.dumps(filtered))
+    return {k: data[k] for k in FIELD_KEYS if data.get(k) is not None}
 
 
-def main(pkg):
-    cache_file = INFO_DIR / f"{pkg}.json"
-    if not cache_is_fresh(cache_file):
-        write_json(pkg, cache_file)
+def fetch_info(names: list[str]) -> None:
+    now = time.time()
+    rows = [(name, json.dumps(format_info(data)), now) for name, data in rpc_info(names).items()]
+    _db().executemany("INSERT OR REPLACE INTO info VALUES (?, ?, ?)", rows)
+
+
+def render(pkg, columns=COLUMNS):
+    data = cached_info(pkg)
+    if data is None:
+        fetch_info([pkg])
+        data = cached_info(pkg)
+    if data is None:
+        raise ArfException(f"No package information found for {pkg}.")
 
-    wrap_print("Repository", "AUR")
-    data = json.loads(cache_file.read_text())
+    lines = [wrap_line("Repository", "AUR", columns)]
     for key, label in FIELDS:
-        wrap_print(label, str(data.get(key, "None")))
+        lines.append(wrap_line(label, str(data.get(key, "None")), columns))
+    return "".join(lines)
+
+
+class InfoPrefetcher:
+    def __init__(self):
+        self.pending = deque()
+        self.requested = set()
+        self.ready = threading.Condition()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def request(self, names: Iterable[str]) -> None:
+        with self.ready:
+            new = [name for name in names if name not in self.requested]
+            self.requested.update(new)
+            # Newest requests follow the cursor, so they jump the queue
+            self.pending.extendleft(reversed(new))
+            self.ready.notify()
+
+    def run(self):
+        while True:
+            with self.ready:
+                while not self.pending:
+                    self.ready.wait()
+                batch = [
+                    self.pending.popleft() for _ in range(min(PREFETCH_BATCH, len(self.pending)))
+                ]
+            try:
+                if names := stale(batch):
+                    fetch_info(names)
+            except ArfException:
+                # The preview reports errors when the package is actually shown
+                pass
+
+
+def main(pkg):
+    try:
+        print(render(pkg), end="")
+    except ArfException as e:
+        print_error(str(e))
+        exit(1)
 
 
 if __name__ == "__main__":
@@ -1,136 +1,209 @@
 import shlex
-import shutil
-import subprocess
-import sys
-from arf import ui
-from arf.alpm import Alpm
-from arf.config import ARF_CACHE, EXCLUDE_PACKAGE_PATTERN, PACMAN_AUTH, PKGS_DIR
-from arf.exceptions import SrcinfoParseError
-from arf.fetch import download_package_list, get_repo, package_list
-from arf.format import Colors, print_step, print_error, print_warning
+from arf import artifacts, cleanup, info, mirror, process, review, srcinfo_cache, ui, vcs
+from arf.alpm import get_alpm
+from arf.build import build_and_install
+from arf.config import BUILD_JOBS, GIT_STORAGE, LOCAL_REPO_NAME
+from arf.fetch import (
+    download_metadata,
+    download_package_list,
+    get_repo,
+    package_list,
+    pin_repo,
+    prefetch_repos,
+    rpc_info,
+    share_objects,
+)
+from arf.exceptions import ArfException
+from arf.format import format_size, print_step, print_error, print_warning
+from arf.plan import Answers, build_plan, load_plan, write_plan
+from arf.process import run_pacman
 from arf.resolve import Resolver
-from pyalpm import vercmp
-from srcinfo.parse import parse_srcinfo
 
-alpm = Alpm()
 
+def batch_answers(args) -> Answers | None:
+    if not (args.noconfirm or args.answers or args.plan or args.apply):
+        return None
+    process.pacman_flags.append("--noconfirm")
+    return Answers(args.answers)
 
-def run_command(cmd, cwd=None):
-    try:
-        subprocess.run(cmd, cwd=cwd, check=True)
-    except KeyboardInterrupt:
-        sys.exit(130)
-    except subprocess.CalledProcessError as e:
-        sys.exit(e.returncode)
 
+def publish_mode(args) -> bool:
+    if args.publish:
+        # Rebuild from the AUR instead of resolving to what an earlier run published
+        get_alpm().ignore_repo(LOCAL_REPO_NAME)
+    return args.publish
 
-def run_pacman(args):
-    run_command([PACMAN_AUTH, "pacman", *args])
 
+def build_flags(mflags, batch: bool) -> list[str]:
+    flags = shlex.split(mflags) if mflags else []
+    return [*flags, "--noconfirm"] if batch else flags
 
-def get_pkg_archives(repo):
-    proc = subprocess.run(
-        ["makepkg", "--packagelist"], text=True, capture_output=True, cwd=str(repo)
-    )
-    packages = proc.stdout.strip().splitlines()
-    return [pkg for pkg in packages if not EXCLUDE_PACKAGE_PATTERN.match(pkg)]
-
-
-def install_packages(packages, makepkg_flags="", skip=None):
-    skip = skip or []
 
+def resolve_packages(packages, answers=None):
     print_step("Resolving dependencies...")
-    resolver = Resolver(alpm, ui.provider_prompt, ui.group_prompt)
-    pacman, aur = resolver.resolve(packages)
+    if answers:
+        resolver = Resolver(get_alpm(), answers.provider, answers.group)
+    else:
+        resolver = Resolver(get_alpm(), ui.provider_prompt, ui.group_prompt)
+    return resolver.resolve(packages)
+
 
+def install_resolved(pacman, aur, graph, flags, jobs, publish=False):
     pacman_names = [p["name"] for p in pacman]
     pacman_deps = [p["name"] for p in pacman if p.get("dependency")]
-    needs_review = sorted(p["name"] for p in aur if p["name"] not in skip)
-
-    if needs_review and not ui.review_prompt(needs_review):
-        return
-
     if pacman:
         print_step("Installing Pacman packages...")
         run_pacman(["-S", "--needed", *pacman_names])
         if pacman_deps:
             run_pacman(["-Dq", "--asdeps", *pacman_deps])
     if aur:
-        batch_install = []
-        flags = shlex.split(makepkg_flags) if makepkg_flags else []
-        total = len(aur)
-        for i, pkg in enumerate(aur, start=1):
-            print_step(f"Installing AUR package: {pkg['name']} ({i}/{total})", pad=True)
-            repo = get_repo(pkg["name"])
-            if pkg["dependency"]:
-                run_command(["makepkg", "--install", "--asdeps", *flags], cwd=repo)
-            else:
-                run_command(["makepkg", *flags], cwd=repo)
-                batch_install += get_pkg_archives(repo)
-        run_pacman(["-U", *batch_install])
+        build_and_install(aur, graph, flags, jobs, publish)
+
+
+def install_packages(
+    packages, makepkg_flags="", skip=None, jobs=BUILD_JOBS, answers=None, publish=False
+):
+    skip = skip or []
+    pacman, aur, graph = resolve_packages(packages, answers)
+
+    needs_review = sorted(p["name"] for p in aur if p["name"] not in skip)
+    # Resolving from the metadata mirror leaves the build scripts still to be cloned
+    prefetch_repos(needs_review)
+    for name in needs_review:
+        get_repo(name)
+    # Batch runs have no one to review, the answers file is the sign-off
+    if needs_review and not answers:
+        summaries = review.prepare(needs_review, get_alpm())
+        if not ui.review_prompt(needs_review, summaries):
+            return
+
+    flags = build_flags(makepkg_flags, bool(answers))
+    install_resolved(pacman, aur, graph, flags, jobs, publish)
+
+
+def apply_plan(path, jobs, publish=False):
+    plan = load_plan(path)
+    if plan["sysupgrade"]:
+        run_pacman(["-Syu"])
+
+    aur = plan["aur"]
+    prefetch_repos(pkg["name"] for pkg in aur)
+    for pkg in aur:
+        # Build exactly what the controller resolved, even if the AUR has moved on
+        pin_repo(pkg["name"], pkg["commit"])
+    graph = {pkg["name"]: set(pkg["depends"]) for pkg in aur}
+    flags = build_flags(plan["makepkg_flags"], batch=True)
+    install_resolved(plan["pacman"], aur, graph, flags, jobs, publish)
+
+
+def install_candidates(aur_only: bool, no_aur: bool):
+    # Repo packages go first so the picker is usable while AUR names stream in
+    if not aur_only:
+        yield from sorted(get_alpm().all_sync_packages())
+    if not no_aur:
+        yield from package_list().fzf_lines(dim=not aur_only)
 
 
 def cmd_install(args):
+    answers = batch_answers(args)
+    publish = publish_mode(args)
+    if args.apply:
+        return apply_plan(args.apply, args.jobs, publish)
+
     packages = args.packages
     if not packages:
-        items = []
-        if not args.aur_only:
-            items += sorted(alpm.all_sync_packages())
+        if answers:
+            raise ArfException("Batch mode needs packages to install.")
         if not args.no_aur:
-            aur_packages = sorted(package_list())
-            if items:
-                items += [Colors.DIM + pkg + Colors.RESET for pkg in aur_packages]
-            else:
-                items += aur_packages
+            # Download the list up front rather than inside the fzf feeder thread
+            package_list()
         packages = ui.select(
-            items,
+            install_candidates(args.aur_only, args.no_aur),
             "Select packages to install",
             preview="package.sh",
         )
 
-    if packages:
-        install_packages(packages, makepkg_flags=args.mflags)
+    if args.plan:
+        resolved = resolve_packages(packages, answers)
+        write_plan(build_plan("install", resolved, get_alpm(), args.mflags), args.plan)
+    elif packages:
+        install_packages(
+            packages, makepkg_flags=args.mflags, jobs=args.jobs, answers=answers, publish=publish
+        )
 
 
 def cmd_update(args):
-    if not args.aur_only:
+    from pyalpm import vercmp
+
+    answers = batch_answers(args)
+    publish = publish_mode(args)
+    if args.apply:
+        return apply_plan(args.apply, args.jobs, publish)
+
+    alpm = get_alpm()
+    # A plan records the system upgrade for --apply instead of running it
+    if not args.aur_only and not args.plan:
         run_pacman(["-Syu"])
+    selected = []
     if not args.no_aur:
         updates = []
+        devel = []
         print_step("Checking for AUR updates...")
-        aur_pkgs = package_list()
+        candidates = [pkg for pkg in alpm.foreign_packages() if not pkg.endswith("-debug")]
+        aur_info = rpc_info(candidates)
 
-        for pkg in alpm.foreign_packages():
-            if pkg.endswith("-debug"):
-                continue
-            if pkg not in aur_pkgs:
+        for pkg in sorted(candidates):
+            if pkg not in aur_info:
                 print_warning(f"Skipping unknown package: {pkg}")
                 continue
-            path = get_repo(pkg)
-            with open(path / ".SRCINFO", "r") as f:
-                srcinfo, errors = parse_srcinfo(f.read())
-                if errors:
-                    raise SrcinfoParseError(pkg, errors)
-
             installed_version = alpm.get_local_package(pkg).version
-            new_version = srcinfo["pkgver"] + "-" + srcinfo["pkgrel"]
-            if vercmp(installed_version, new_version) < 0 or (args.devel and pkg.endswith("-git")):
+            if vercmp(installed_version, aur_info[pkg]["Version"]) < 0:
                 updates.append(pkg)
+            elif args.devel and pkg.endswith("-git"):
+                devel.append(pkg)
+
+        if devel:
+            print_step("Checking development packages upstream...")
+            updates = sorted(updates + vcs.outdated(devel))
+
+        # The diff preview needs every candidate pulled before fzf opens
+        prefetch_repos(updates)
+        for pkg in updates:
+            get_repo(pkg)
 
         if not updates:
             print("All AUR packages are up to date.")
-            return
-
-        selected = ui.select(updates, "Select AUR packages to update", preview="diff.sh", all=True)
-        if selected:
-            install_packages(selected, skip=selected, makepkg_flags=args.mflags)
+        elif answers:
+            selected = updates
+        else:
+            selected = ui.select(
+                updates,
+                "Select AUR packages to update",
+                preview="diff.sh",
+                all=True,
+                details=review.prepare(updates, alpm),
+            )
+
+    if args.plan:
+        resolved = resolve_packages(selected, answers)
+        plan = build_plan("update", resolved, alpm, args.mflags, sysupgrade=not args.aur_only)
+        write_plan(plan, args.plan)
+    elif selected:
+        install_packages(
+            selected,
+            skip=selected,
+            makepkg_flags=args.mflags,
+            jobs=args.jobs,
+            answers=answers,
+            publish=publish,
+        )
 
 
 def cmd_remove(args):
     if args.packages:
         packages = args.packages
     else:
-        items = sorted(alpm.explicit_not_required())
+        items = sorted(get_alpm().explicit_not_required())
         packages = ui.select(
             items,
             "Select packages to remove",
@@ -141,27 +214,37 @@ def cmd_remove(args):
 
 
 def cmd_clean(args):
-    orphans = alpm.orphans()
-    if orphans:
-        print_step("Removing orphaned packages...")
-        run_pacman(["-Rns", *orphans])
-
-    if not PKGS_DIR.is_dir():
-        return
+    alpm = get_alpm()
+    orphans = set()
+    if not args.cache_only:
+        orphans = alpm.orphans()
+        if orphans:
+            print_step("Removing orphaned packages...")
+            run_pacman(["-Rns", *orphans])
 
     print_step("Cleaning Arf's cache...")
 
-    foreign = alpm.foreign_packages()
-    for subdir in PKGS_DIR.iterdir():
-        name = subdir.name
-        if name not in foreign:
-            try:
-                shutil.rmtree(subdir)
-                print(f" Removed PKGBUILD directory for {name}")
-            except PermissionError as e:
-                print_error(str(e))
+    if freed := artifacts.evict():
+        print(f" Removed {format_size(freed)} of cached builds")
+
+    # The local snapshot predates the orphan removal above
+    freed, errors = cleanup.collect_garbage(alpm.foreign_packages() - orphans, alpm)
+    for category, (count, size) in freed.items():
+        print(f" Removed {format_size(size)} of {cleanup.LABELS[category]} ({count} entries)")
+    for error in errors:
+        print_error(error)
+
+    if pruned := info.prune() + srcinfo_cache.prune():
+        print(f" Removed {pruned} stale metadata entries")
+
+    if GIT_STORAGE != "full":
+        share_objects()
 
 
 def cmd_sync(args):
-    shutil.rmtree(ARF_CACHE / "info", ignore_errors=True)
+    info.clear_cache()
     download_package_list(force=True)
+    if args.full or (args.full is None and mirror.enabled()):
+        download_metadata()
+    elif args.full is False:
+        mirror.clear()
@@ -0,0 +1,88 @@
+import json
+from arf import store
+from arf.config import ARF_CACHE
+from collections.abc import Iterable
+
+# Written after a complete import, its presence is what turns the mirror on
+META_PATH = ARF_CACHE / "mirror.json"
+BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mirror_provides (
+    provide TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mirror_provides_provide ON mirror_provides (provide);
+"""
+
+
+def _db():
+    return store.connect(SCHEMA)
+
+
+def enabled() -> bool:
+    return META_PATH.exists()
+
+
+def meta() -> dict:
+    return json.loads(META_PATH.read_text()) if enabled() else {}
+
+
+def replace(records: Iterable[dict], new_meta: dict) -> int:
+    db = _db()
+    count = 0
+    db.execute("BEGIN")
+    try:
+        db.execute("DELETE FROM mirror")
+        db.execute("DELETE FROM mirror_provides")
+        for record in records:
+            name = record["Name"]
+            db.execute("INSERT OR REPLACE INTO mirror VALUES (?, ?)", (name, json.dumps(record)))
+            db.executemany(
+                "INSERT INTO mirror_provides VALUES (?, ?)",
+                ((provide.split("=", 1)[0], name) for provide in record.get("Provides") or ()),
+            )
+            count += 1
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    META_PATH.write_text(json.dumps(new_meta))
+    return count
+
+
+def clear() -> None:
+    META_PATH.unlink(missing_ok=True)
+    db = _db()
+    db.execute("DELETE FROM mirror")
+    db.execute("DELETE FROM mirror_provides")
+
+
+def info(names: Iterable[str]) -> dict[str, dict]:
+    names = list(names)
+    results = {}
+    for i in range(0, len(names), BATCH):
+        batch = names[i : i + BATCH]
+        rows = _db().execute(
+            f"SELECT name, data FROM mirror WHERE name IN ({','.join('?' * len(batch))})", batch
+        )
+        results.update((name, json.loads(data)) for name, data in rows)
+    return results
+
+
+def record(name: str) -> dict | None:
+    row = _db().execute("SELECT data FROM mirror WHERE name = ?", (name,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def providers(name: str) -> list[dict]:
+    rows = _db().execute(
+        "SELECT m.data FROM mirror_provides p JOIN mirror m ON m.name = p.name"
+        " WHERE p.provide = ?",
+        (name,),
+    )
+    return [json.loads(data) for (data,) in rows]
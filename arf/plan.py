@@ -0,0 +1,91 @@
+import json
+import subprocess
+from arf.exceptions import PlanError
+from arf.fetch import get_repo
+from arf.resolve import ResolvedPackages
+from arf.srcinfo_cache import read_srcinfo
+from pathlib import Path
+
+FORMAT = 1
+
+
+class Answers:
+    def __init__(self, path: str | None = None):
+        data = {}
+        if path:
+            try:
+                data = json.loads(Path(path).read_text())
+            except (OSError, ValueError) as e:
+                raise PlanError(f"Could not read answers file {path}: {e}") from e
+        self.providers: dict[str, str] = data.get("providers", {})
+        self.groups: dict[str, list[str]] = data.get("groups", {})
+
+    def provider(self, name: str, providers: list[str]) -> str:
+        # Without a pinned answer, take the first candidate like pacman --noconfirm does
+        choice = self.providers.get(name, providers[0])
+        if choice not in providers:
+            raise PlanError(f"Pinned provider {choice} for {name} is not available")
+        return choice
+
+    def group(self, name: str, members: list[str]) -> list[str]:
+        chosen = self.groups.get(name, sorted(members))
+        if missing := set(chosen) - set(members):
+            raise PlanError(f"Pinned members of {name} not in the group: {', '.join(missing)}")
+        return chosen
+
+
+def _head(repo: Path) -> str:
+    return subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def build_plan(
+    command: str, resolved: ResolvedPackages, alpm, makepkg_flags: str, sysupgrade: bool = False
+) -> dict:
+    aur_names = {pkg["name"] for pkg in resolved.aur}
+    pacman = [
+        {
+            "name": pkg["name"],
+            "version": alpm.get_sync_package(pkg["name"]).version,
+            "dependency": pkg["dependency"],
+        }
+        for pkg in resolved.pacman
+    ]
+    aur = []
+    for pkg in resolved.aur:
+        repo = get_repo(pkg["name"])
+        local = alpm.get_local_package(pkg["name"])
+        aur.append(
+            {
+                "name": pkg["name"],
+                "version": read_srcinfo(pkg["name"], repo)["version"],
+                "installed": local.version if local else None,
+                "commit": _head(repo),
+                "dependency": pkg["dependency"],
+                "depends": sorted(resolved.graph[pkg["name"]] & aur_names),
+            }
+        )
+    return {
+        "format": FORMAT,
+        "command": command,
+        "sysupgrade": sysupgrade,
+        "makepkg_flags": makepkg_flags or "",
+        "pacman": pacman,
+        # Already in build order
+        "aur": aur,
+    }
+
+
+def write_plan(plan: dict, path: str) -> None:
+    Path(path).write_text(json.dumps(plan, indent=2) + "\n")
+
+
+def load_plan(path: str) -> dict:
+    try:
+        plan = json.loads(Path(path).read_text())
+    except (OSError, ValueError) as e:
+        raise PlanError(f"Could not read plan {path}: {e}") from e
+    if plan.get("format") != FORMAT:
+        raise PlanError(f"Unsupported plan format in {path}")
+    return plan
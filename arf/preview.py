@@ -0,0 +1,95 @@
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+from arf import info
+from arf.alpm import get_alpm
+from arf.exceptions import ArfException
+from arf.fetch import package_list
+from arf.format import Colors, format_size
+from contextlib import contextmanager
+from functools import cache
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import unquote
+
+PREFETCH_BEHIND = 20
+PREFETCH_AHEAD = 200
+
+_alpm_lock = threading.Lock()
+
+
+@cache
+def _prefetcher() -> info.InfoPrefetcher:
+    return info.InfoPrefetcher()
+
+
+def render_sync(pkg, columns: int) -> str:
+    fields = [
+        ("Repository", pkg.db.name),
+        ("Name", pkg.name),
+        ("Version", pkg.version),
+        ("Description", pkg.desc),
+        ("Architecture", pkg.arch),
+        ("URL", pkg.url),
+        ("Licenses", pkg.licenses),
+        ("Groups", pkg.groups),
+        ("Provides", pkg.provides),
+        ("Depends On", pkg.depends),
+        ("Optional Deps", pkg.optdepends),
+        ("Conflicts With", pkg.conflicts),
+        ("Replaces", pkg.replaces),
+        ("Download Size", format_size(pkg.size)),
+        ("Installed Size", format_size(pkg.isize)),
+        ("Packager", pkg.packager),
+        ("Build Date", info.format_timestamp(pkg.builddate)),
+    ]
+    return "".join(
+        info.wrap_line(label, str(info.normalize(value) or "None"), columns)
+        for label, value in fields
+    )
+
+
+def render_package(name: str, columns: int) -> str:
+    with _alpm_lock:
+        if pkg := get_alpm().get_sync_package(name):
+            return render_sync(pkg, columns)
+    # The picker lists AUR names in index order, so these are the rows around the cursor when
+    # no filter is typed. With a filter, fzf ranks matches by score and these are only neighbours
+    _prefetcher().request(package_list().around(name, PREFETCH_BEHIND, PREFETCH_AHEAD))
+    return info.render(name, columns)
+
+
+class _PreviewHandler(BaseHTTPRequestHandler):
+    # Spoken over the Unix socket so package.sh can ask with curl instead of starting Python
+    def do_GET(self):
+        _, columns, name = self.path.split("/", 2)
+        try:
+            output = render_package(unquote(name), int(columns))
+        except ArfException as e:
+            output = f"{Colors.RED}Error: {Colors.RESET}{e}\n"
+        body = output.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def preview_server():
+    directory = tempfile.mkdtemp(prefix="arf-")
+    server = socketserver.ThreadingUnixStreamServer(
+        os.path.join(directory, "preview.sock"), _PreviewHandler
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server.server_address
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(directory, ignore_errors=True)
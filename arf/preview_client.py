@@ -0,0 +1,24 @@
+# Only used when curl is missing, kept to the standard library so it starts quickly
+import os
+import socket
+import sys
+from urllib.parse import quote
+
+
+def main(pkg):
+    columns = os.environ.get("FZF_PREVIEW_COLUMNS", "80")
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(os.environ["ARF_PREVIEW_SOCKET"])
+        sock.sendall(f"GET /{columns}/{quote(pkg)} HTTP/1.0\r\n\r\n".encode())
+        response = b"".join(iter(lambda: sock.recv(65536), b""))
+    head, _, body = response.partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.0 200"):
+        sys.exit(1)
+    sys.stdout.buffer.write(body)
+
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1])
+    except OSError:
+        sys.exit(1)
@@ -1,12 +1,7 @@
 #!/bin/sh
-pkg=$1
-cd "$PKGS_DIR/$pkg"
-
-if pacman -Qqs "^$pkg$" >/dev/null; then
-    date=$(pacman -Qi "$pkg" | sed -n 's/^Build Date *: //p')
-    commit=$(git log --before "$(date -d "$date" +%s)" -1 --pretty="%h")
-else
-    commit=$(git hash-object -t tree /dev/null)
+# Precomputed by arf.review before fzf opened
+cached="$ARF_DIFF_DIR/$1.diff"
+if [ -f "$cached" ] && ! [ "$PKGS_DIR/$1/PKGBUILD" -nt "$cached" ]; then
+    exec cat "$cached"
 fi
-
-git diff --color=always "$commit" -- . ':!.SRCINFO' ':!.gitignore'
+exec python -m arf.review "$1"
@@ -1,6 +1,15 @@
 #!/bin/sh
 COLUMNS=$FZF_PREVIEW_COLUMNS
 
+# curl asks the preview server without starting an interpreter on every cursor move
+if [ -n "$ARF_PREVIEW_SOCKET" ]; then
+    if command -v curl >/dev/null; then
+        curl -sf --unix-socket "$ARF_PREVIEW_SOCKET" "http://arf/${COLUMNS:-80}/$1" && exit
+    else
+        python -m arf.preview_client "$1" && exit
+    fi
+fi
+
 pacman_output=$(pacman -Si --color=always "$1" 2>/dev/null)
 if [ $? -eq 0 ]; then
     echo "$pacman_output" | sed '/^$/q';
@@ -0,0 +1,21 @@
+import subprocess
+import sys
+from arf import trace
+from arf.config import PACMAN_AUTH
+
+# Batch runs add --noconfirm here so no pacman call waits on a prompt
+pacman_flags: list[str] = []
+
+
+def run_command(cmd, cwd=None):
+    try:
+        with trace.command_span(cmd):
+            subprocess.run(cmd, cwd=cwd, check=True)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except subprocess.CalledProcessError as e:
+        sys.exit(e.returncode)
+
+
+def run_pacman(args):
+    run_command([PACMAN_AUTH, "pacman", *args, *pacman_flags])
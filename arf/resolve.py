@@ -1,14 +1,33 @@
-import re
-from arf import fetch
-from arf.exceptions import SrcinfoParseError, PackageResolutionError
+from arf import fetch, mirror
+from arf.alpm import parse_dep, satisfies
+from arf.config import FETCH_JOBS
+from arf.exceptions import PackageResolutionError
 from arf.format import print_warning
-from srcinfo.parse import parse_srcinfo
+from arf.srcinfo_cache import read_srcinfo
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from typing import NamedTuple
 
+# (name id, operator, version), e.g. foo>=1.2 is (id of foo, ">=", "1.2")
+Requirement = tuple[int, str, str]
+
 
 class ResolvedPackages(NamedTuple):
     pacman: list[dict]
     aur: list[dict]
+    graph: dict[str, set[str]]
+
+
+class Node:
+    __slots__ = ("version", "repo", "explicit", "provides", "depends")
+
+    def __init__(self):
+        self.version: str | None = None
+        self.repo = False
+        self.explicit = False
+        # (name id, version) pairs, parsed once from the provides array
+        self.provides: tuple[tuple[int, str], ...] = ()
+        self.depends: tuple[Requirement, ...] = ()
 
 
 class Resolver:
@@ -17,98 +36,241 @@ class Resolver:
         self.select_provider = select_provider
         self.select_group = select_group
 
-        self.resolved = set()
-        self.resolving = set()
-        self.provider_cache = {}
-        self.dependency_cache = {}
-        self.pacman = []
-        self.aur = []
-
-    def strip_version(self, pkg_name: str) -> str:
-        return re.split(r"[<>=]", pkg_name, maxsplit=1)[0]
-
-    def fetch_aur_dependencies(self, name: str) -> set[str]:
-        repo = fetch.get_repo(name)
-
-        with open(repo / ".SRCINFO", "r") as f:
-            parsed, errors = parse_srcinfo(f.read())
-            if errors:
-                raise SrcinfoParseError(name, errors)
-            deps = set(parsed.get("depends", []) + parsed.get("makedepends", []))
-
-            for subpkg in parsed.get("packages", {}).values():
-                deps.update(subpkg.get("depends", []))
-            return deps
-
-    def get_provider(self, pkg_name: str) -> str | None:
-        repo_providers = self.alpm.get_providers(pkg_name)
-        if repo_providers:
-            providers = sorted(repo_providers)
-        else:
-            if pkg_name in fetch.package_list():
-                return pkg_name
-            response = fetch.search_rpc(pkg_name, by="provides")
-            providers = sorted({p["Name"] for p in response})
-            if not providers:
-                return None
+        # Package names are interned, everything below refers to them by index
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.nodes: dict[int, Node] = {}
+        self.provider_cache: dict[int, int] = {}
+        self.groups: set[int] = set()
+        # Edge i runs from parents[i] to children[i]
+        self.parents = array("l")
+        self.children = array("l")
+        # (parent, provider, *requirement) for the edges that carry a version constraint
+        self.constraints: list[tuple[int, int, int, str, str]] = []
+        # Metadata mirror records for the level being expanded
+        self.mirrored: dict[str, dict] = {}
 
-        if len(providers) == 1:
-            return providers[0]
+    def intern(self, name: str) -> int:
+        if (name_id := self.ids.get(name)) is None:
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
 
-        return self.select_provider(pkg_name, providers)
+    def requirement(self, dep: str) -> Requirement:
+        name, op, version = parse_dep(dep)
+        return self.intern(name), op, version
 
-    def handle_group(self, name: str, members: list) -> None:
-        selected = self.select_group(name, members)
-        for pkg in selected:
-            self.visit(pkg)
-        self.resolving.remove(name)
-        self.resolved.add(name)
+    def dep_string(self, requirement: Requirement) -> str:
+        name_id, op, version = requirement
+        return f"{self.names[name_id]}{op}{version}"
 
-    def visit(self, pkg: str, parent=None) -> None:
-        pkg = self.strip_version(pkg)
-        if (parent and self.alpm.is_installed(pkg)) or pkg in self.resolved:
-            return
+    def parse_provides(self, provides: list[str]) -> tuple[tuple[int, str], ...]:
+        return tuple((name_id, version) for name_id, _, version in map(self.requirement, provides))
 
-        if pkg in self.resolving:
-            print_warning(f"Dependency cycle detected for {pkg}")
+    def fetch_aur_dependencies(self, name: str, node: Node) -> None:
+        if record := self.mirrored.get(name):
+            node.version = record["Version"]
+            node.provides = self.parse_provides(record.get("Provides") or [])
+            deps = set((record.get("Depends") or []) + (record.get("MakeDepends") or []))
+            node.depends = tuple(self.requirement(dep) for dep in sorted(deps))
             return
 
-        self.resolving.add(pkg)
-        repo_provider = None
-
-        if repo_pkg := self.alpm.get_sync_package(pkg):
-            provider = pkg
-            repo_provider = repo_pkg
-        elif pkg in self.provider_cache:
-            provider = self.provider_cache[pkg]
-        elif provider := self.get_provider(pkg):
-            self.provider_cache[pkg] = provider
-        elif group_pkgs := self.alpm.get_group(pkg):
-            self.handle_group(pkg, group_pkgs)
-            return
-        else:
-            raise PackageResolutionError(pkg, parent)
+        srcinfo = read_srcinfo(name, fetch.get_repo(name))
+        deps = set(srcinfo["depends"] + srcinfo["makedepends"])
+        provides = list(srcinfo["provides"])
+        for subpkg in srcinfo["packages"].values():
+            deps.update(subpkg.get("depends", []))
+            provides += subpkg.get("provides", [])
+        node.version = srcinfo["version"]
+        node.provides = self.parse_provides(provides)
+        node.depends = tuple(self.requirement(dep) for dep in sorted(deps))
 
-        if provider != pkg and repo_provider is None:
-            repo_provider = self.alpm.get_sync_package(provider)
+    def choose_provider(self, pkg_name: str, providers: list[str]) -> str | None:
+        if len(providers) == 1:
+            return providers[0]
+        return self.select_provider(pkg_name, providers)
 
-        if repo_provider:
-            deps = repo_provider.depends
+    def provides(self, provider: int, requirement: Requirement) -> bool:
+        name_id, op, version = requirement
+        node = self.nodes[provider]
+        if name_id == provider:
+            candidate = node.version
         else:
-            deps = self.dependency_cache.setdefault(provider, self.fetch_aur_dependencies(provider))
+            candidate = next((v for n, v in node.provides if n == name_id), None)
+        return satisfies(candidate, op, version)
 
-        for dep in deps:
-            self.visit(dep, parent=pkg)
+    def find_providers(self, requirements: dict[int, list[Requirement]]) -> dict[int, int]:
+        providers = {}
+        unknown = []
+        aur_names = fetch.package_list()
 
-        self.resolving.remove(pkg)
-        self.resolved.add(pkg)
+        for name_id, group in requirements.items():
+            name = self.names[name_id]
+            cached = self.provider_cache.get(name_id)
+            # A provider picked for an earlier level may not meet a constraint added by this one
+            if cached is not None and all(self.provides(cached, r) for r in group):
+                providers[name_id] = cached
+            elif self.alpm.get_sync_package(name):
+                providers[name_id] = name_id
+            elif repo_providers := set.intersection(
+                *(self.alpm.get_providers(self.dep_string(r)) for r in group)
+            ):
+                if provider := self.choose_provider(name, sorted(repo_providers)):
+                    providers[name_id] = self.intern(provider)
+            elif name in aur_names:
+                providers[name_id] = name_id
+            else:
+                unknown.append(name)
 
-        if repo_provider:
-            self.pacman.append({"name": provider, "dependency": parent is not None})
-        else:
-            self.aur.append({"name": provider, "dependency": parent is not None})
+        if unknown:
+            # The local name index can lag behind the AUR
+            found = fetch.rpc_info(unknown)
+            providers.update((self.ids[name], self.ids[name]) for name in unknown if name in found)
+            virtual = [name for name in unknown if name not in found]
+            with ThreadPoolExecutor(max_workers=FETCH_JOBS) as pool:
+                responses = pool.map(lambda n: fetch.search_rpc(n, by="provides"), virtual)
+                for name, response in zip(virtual, responses):
+                    candidates = sorted({p["Name"] for p in response})
+                    if candidates and (provider := self.choose_provider(name, candidates)):
+                        providers[self.ids[name]] = self.intern(provider)
+
+        self.provider_cache.update(providers)
+        return providers
+
+    def expand(
+        self, frontier: list[tuple[Requirement, int | None]]
+    ) -> list[tuple[Requirement, int | None]]:
+        pending = []
+        for requirement, parent in frontier:
+            if (
+                parent is not None
+                and requirement[0] not in self.provider_cache
+                and self.alpm.is_installed(self.dep_string(requirement))
+            ):
+                continue
+            pending.append((requirement, parent))
+
+        requirements = {}
+        for requirement, _ in pending:
+            requirements.setdefault(requirement[0], []).append(requirement)
+        providers = self.find_providers(requirements)
+
+        added = []
+        next_frontier = []
+        for requirement, parent in pending:
+            name_id, op, _ = requirement
+            provider = providers.get(name_id)
+            if provider is None:
+                if name_id in self.groups:
+                    continue
+                self.groups.add(name_id)
+                name = self.names[name_id]
+                if (members := self.alpm.get_group(name)) is None:
+                    parent_name = None if parent is None else self.names[parent]
+                    raise PackageResolutionError(self.dep_string(requirement), parent_name)
+                next_frontier += [
+                    ((self.intern(pkg), "", ""), None) for pkg in self.select_group(name, members)
+                ]
+                continue
+
+            if (node := self.nodes.get(provider)) is None:
+                node = self.nodes[provider] = Node()
+                added.append(provider)
+            if parent is None:
+                node.explicit = True
+            else:
+                self.parents.append(parent)
+                self.children.append(provider)
+                if op:
+                    self.constraints.append((parent, provider, *requirement))
+
+        aur = []
+        for provider in added:
+            node = self.nodes[provider]
+            if repo_pkg := self.alpm.get_sync_package(self.names[provider]):
+                node.repo = True
+                node.version = repo_pkg.version
+                node.provides = self.parse_provides(repo_pkg.provides)
+                node.depends = tuple(map(self.requirement, repo_pkg.depends))
+            else:
+                aur.append(provider)
+
+        aur_names = [self.names[provider] for provider in aur]
+        # A local metadata mirror answers without cloning anything
+        self.mirrored = mirror.info(aur_names) if mirror.enabled() else {}
+        # Clone the whole level at once, then read each .SRCINFO as its repo lands
+        fetch.prefetch_repos(name for name in aur_names if name not in self.mirrored)
+        for provider in aur:
+            self.fetch_aur_dependencies(self.names[provider], self.nodes[provider])
+
+        for provider in added:
+            next_frontier += [(dep, provider) for dep in self.nodes[provider].depends]
+        return next_frontier
+
+    def check_constraints(self) -> None:
+        for parent, provider, name_id, op, version in self.constraints:
+            if not self.provides(provider, (name_id, op, version)):
+                raise PackageResolutionError(
+                    self.dep_string((name_id, op, version)), self.names[parent]
+                )
+
+    def adjacency(self) -> tuple[array, array]:
+        # Compressed rows: the children of n are targets[offsets[n]:offsets[n + 1]]
+        offsets = array("l", [0]) * (len(self.names) + 1)
+        for parent in self.parents:
+            offsets[parent + 1] += 1
+        for i in range(len(self.names)):
+            offsets[i + 1] += offsets[i]
+        targets = array("l", [0]) * len(self.children)
+        fill = array("l", offsets)
+        for parent, child in zip(self.parents, self.children):
+            targets[fill[parent]] = child
+            fill[parent] += 1
+        return offsets, targets
+
+    def topological_order(self) -> list[int]:
+        offsets, targets = self.adjacency()
+        names = self.names
+
+        def children(node: int) -> list[int]:
+            return sorted(set(targets[offsets[node] : offsets[node + 1]]), key=names.__getitem__)
+
+        order = []
+        done = set()
+        active = set()
+        for root in self.nodes:
+            if root in done:
+                continue
+            stack = [(root, iter(children(root)))]
+            active.add(root)
+            while stack:
+                node, deps = stack[-1]
+                for dep in deps:
+                    if dep in active:
+                        print_warning(f"Dependency cycle detected for {names[dep]}")
+                    elif dep not in done:
+                        active.add(dep)
+                        stack.append((dep, iter(children(dep))))
+                        break
+                else:
+                    stack.pop()
+                    active.remove(node)
+                    done.add(node)
+                    order.append(node)
+        return order
 
     def resolve(self, targets: list[str]) -> ResolvedPackages:
-        for pkg in targets:
-            self.visit(pkg)
-        return ResolvedPackages(pacman=self.pacman, aur=self.aur)
+        frontier = [(self.requirement(pkg), None) for pkg in targets]
+        while frontier:
+            frontier = self.expand(frontier)
+        self.check_constraints()
+
+        pacman, aur = [], []
+        graph = {self.names[node]: set() for node in self.nodes}
+        for parent, child in zip(self.parents, self.children):
+            graph[self.names[parent]].add(self.names[child])
+        for node_id in self.topological_order():
+            node = self.nodes[node_id]
+            entry = {"name": self.names[node_id], "dependency": not node.explicit}
+            (pacman if node.repo else aur).append(entry)
+        return ResolvedPackages(pacman=pacman, aur=aur, graph=graph)
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+from arf.config import DIFF_DIR, FETCH_JOBS, PKGS_DIR
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from pathlib import Path
+
+PATHSPEC = ["--", ".", ":!.SRCINFO", ":!.gitignore"]
+
+
+def _git(args: list[str], repo: Path) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=repo, capture_output=True, text=True, check=True
+    ).stdout
+
+
+@cache
+def _empty_tree() -> str:
+    return subprocess.run(
+        ["git", "hash-object", "-t", "tree", "--stdin"],
+        input="",
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def _write(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def _prepare(name: str, build_date: int | None) -> str:
+    repo = PKGS_DIR / name
+    diff_path = DIFF_DIR / f"{name}.diff"
+    meta_path = DIFF_DIR / f"{name}.json"
+    key = f"{_git(['rev-parse', 'HEAD'], repo).strip()}:{build_date or 0}"
+    try:
+        meta = json.loads(meta_path.read_text())
+        # A PKGBUILD edited during an earlier review is newer than its diff
+        if meta["key"] == key and diff_path.stat().st_mtime >= (repo / "PKGBUILD").stat().st_mtime:
+            return meta["summary"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    base = ""
+    if build_date:
+        base = _git(["log", "-1", f"--before={build_date}", "--format=%H"], repo).strip()
+    # Not installed, or a shallow clone that does not reach back that far
+    base = base or _empty_tree()
+
+    files = added = removed = 0
+    for line in _git(["diff", "--numstat", base, *PATHSPEC], repo).splitlines():
+        plus, minus, _ = line.split("\t", 2)
+        files += 1
+        # Binary files show "-" for both counts
+        added += int(plus) if plus.isdigit() else 0
+        removed += int(minus) if minus.isdigit() else 0
+    summary = f"{files} file{'s' if files != 1 else ''}, +{added} -{removed}"
+
+    _write(diff_path, _git(["diff", "--color=always", base, *PATHSPEC], repo))
+    _write(meta_path, json.dumps({"key": key, "summary": summary}))
+    return summary
+
+
+def prepare(names: list[str], alpm) -> dict[str, str]:
+    DIFF_DIR.mkdir(parents=True, exist_ok=True)
+    # libalpm is not thread safe, so the build dates are looked up first
+    dates = {}
+    for name in names:
+        pkg = alpm.get_local_package(name)
+        dates[name] = pkg.builddate if pkg else None
+    with ThreadPoolExecutor(max_workers=FETCH_JOBS) as pool:
+        futures = {name: pool.submit(_prepare, name, dates[name]) for name in names}
+    summaries = {}
+    for name, future in futures.items():
+        try:
+            summaries[name] = future.result()
+        except (OSError, subprocess.CalledProcessError):
+            # diff.sh tries again through main() when no cached diff is available
+            (DIFF_DIR / f"{name}.diff").unlink(missing_ok=True)
+    return summaries
+
+
+def main(name: str) -> None:
+    from arf.alpm import get_alpm
+
+    # The cached diff is missing or older than a PKGBUILD edited during the review
+    prepare([name], get_alpm())
+    try:
+        sys.stdout.write((DIFF_DIR / f"{name}.diff").read_text())
+    except FileNotFoundError:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
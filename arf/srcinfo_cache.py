@@ -0,0 +1,69 @@
+import json
+import platform
+from arf import store
+from arf.exceptions import SrcinfoParseError
+from pathlib import Path
+
+# Bump when the stored record changes shape
+FORMAT = 2
+FIELDS = ("depends", "makedepends", "checkdepends", "provides", "source")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS srcinfo (
+    repo TEXT PRIMARY KEY,
+    stamp TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _fields(section: dict) -> dict[str, list[str]]:
+    arch = platform.machine()
+    return {
+        field: section.get(field, []) + section.get(f"{field}_{arch}", [])
+        for field in FIELDS
+        if field in section or f"{field}_{arch}" in section
+    }
+
+
+def parse(name: str, text: str) -> dict:
+    from srcinfo.parse import parse_srcinfo
+
+    parsed, errors = parse_srcinfo(text)
+    if errors:
+        raise SrcinfoParseError(name, errors)
+
+    version = f"{parsed['pkgver']}-{parsed['pkgrel']}"
+    if epoch := parsed.get("epoch"):
+        version = f"{epoch}:{version}"
+    return {
+        "pkgbase": parsed.get("pkgbase", name),
+        "version": version,
+        **{field: [] for field in FIELDS},
+        **_fields(parsed),
+        "packages": {pkg: _fields(section) for pkg, section in parsed.get("packages", {}).items()},
+    }
+
+
+def prune() -> int:
+    db = store.connect(SCHEMA)
+    gone = [repo for (repo,) in db.execute("SELECT repo FROM srcinfo") if not Path(repo).is_dir()]
+    db.executemany("DELETE FROM srcinfo WHERE repo = ?", ((repo,) for repo in gone))
+    return len(gone)
+
+
+def read_srcinfo(name: str, repo: Path) -> dict:
+    path = repo / ".SRCINFO"
+    st = path.stat()
+    stamp = f"{FORMAT}:{st.st_mtime_ns}:{st.st_size}"
+    db = store.connect(SCHEMA)
+
+    row = db.execute("SELECT stamp, data FROM srcinfo WHERE repo = ?", (str(repo),)).fetchone()
+    if row and row[0] == stamp:
+        return json.loads(row[1])
+
+    data = parse(name, path.read_text())
+    db.execute(
+        "INSERT OR REPLACE INTO srcinfo VALUES (?, ?, ?)", (str(repo), stamp, json.dumps(data))
+    )
+    return data
@@ -0,0 +1,20 @@
+import sqlite3
+import threading
+from arf.config import ARF_CACHE
+
+DB_PATH = ARF_CACHE / "cache.db"
+
+_local = threading.local()
+
+
+def connect(schema: str) -> sqlite3.Connection:
+    # sqlite3 connections cannot be shared between threads
+    if not hasattr(_local, "conn"):
+        ARF_CACHE.mkdir(parents=True, exist_ok=True)
+        _local.conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        _local.conn.execute("PRAGMA journal_mode=WAL")
+        _local.schemas = set()
+    if schema not in _local.schemas:
+        _local.conn.executescript(schema)
+        _local.schemas.add(schema)
+    return _local.conn
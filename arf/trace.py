@@ -0,0 +1,115 @@
+import atexit
+import json
+import os
+import shlex
+import sys
+import threading
+import time
+from arf.config import PACMAN_AUTH
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+COMMAND_PHASES = {"git": "git", "makepkg": "build", "pacman": "pacman", "fzf": "fzf"}
+SLOWEST = 5
+
+_spans = []
+_lock = threading.Lock()
+_enabled = False
+_start = 0
+
+
+def enable(path: str | None = None) -> None:
+    global _enabled, _start
+    _enabled = True
+    _start = time.perf_counter_ns()
+    atexit.register(_report, path)
+
+
+def command_phase(cmd: list[str]) -> str:
+    program = cmd[1] if cmd[0] == PACMAN_AUTH and len(cmd) > 1 else cmd[0]
+    return COMMAND_PHASES.get(os.path.basename(program), "subprocess")
+
+
+@contextmanager
+def _record(phase: str, name: str):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        thread = threading.current_thread()
+        with _lock:
+            _spans.append((phase, name, start, end - start, thread.ident, thread.name))
+
+
+def span(phase: str, name: str):
+    return _record(phase, name) if _enabled else nullcontext()
+
+
+def command_span(cmd: list[str]):
+    return span(command_phase(cmd), shlex.join(map(str, cmd))) if _enabled else nullcontext()
+
+
+def traced(phase: str):
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _record(phase, func.__qualname__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _write_trace(path: str, spans: list[tuple]) -> None:
+    pid = os.getpid()
+    events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}}
+        for tid, thread in {(s[4], s[5]) for s in spans}
+    ]
+    events += [
+        {
+            "name": name,
+            "cat": phase,
+            "ph": "X",
+            "ts": (start - _start) / 1000,
+            "dur": duration / 1000,
+            "pid": pid,
+            "tid": tid,
+        }
+        for phase, name, start, duration, tid, _ in spans
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _report(path: str | None) -> None:
+    wall = (time.perf_counter_ns() - _start) / 1e9
+    with _lock:
+        spans = list(_spans)
+
+    phases = {}
+    for phase, _, _, duration, _, _ in spans:
+        count, total, longest = phases.get(phase, (0, 0, 0))
+        phases[phase] = (count + 1, total + duration, max(longest, duration))
+
+    # Spans from worker threads overlap, so phase totals can add up to more than the wall time
+    out = sys.stderr
+    print(f"\nProfile: {wall:.2f}s wall time", file=out)
+    for phase, (count, total, longest) in sorted(phases.items(), key=lambda p: -p[1][1]):
+        print(
+            f"  {phase:<12} {count:>6} calls {total / 1e9:>9.2f}s total {longest / 1e9:>8.2f}s max",
+            file=out,
+        )
+    if spans:
+        print("Slowest:", file=out)
+        for phase, name, _, duration, _, _ in sorted(spans, key=lambda s: -s[3])[:SLOWEST]:
+            label = name if len(name) <= 60 else name[:57] + "..."
+            print(f"  {duration / 1e9:>8.2f}s {phase:<12} {label}", file=out)
+
+    if path:
+        _write_trace(path, spans)
+        print(f"Trace written to {path}", file=out)
@@ -1,12 +1,40 @@
 import subprocess
-from arf.config import DEFAULT_FZF_CMD, EDITOR, PKGS_DIR, PREVIEW_SCRIPTS
+import threading
+from arf import trace
+from arf.config import (
+    DEFAULT_FZF_CMD,
+    DIFF_DIR,
+    EDITOR,
+    PKGS_DIR,
+    PREVIEW_SCRIPTS,
+    PREVIEW_SERVER,
+)
 from arf.format import print_warning
 from arf.format import Colors
+from collections.abc import Iterable, Iterator
+from contextlib import nullcontext
 from os import environ
 
 
+def _feed(stdin, first: str, rest: Iterator[str], errors: list) -> None:
+    try:
+        stdin.write(first + "\n")
+        for item in rest:
+            stdin.write(item + "\n")
+    except BrokenPipeError:
+        # fzf exited before reading everything
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
 def select(
-    items: list[str],
+    items: Iterable[str],
     header: str,
     footer: str = "",
     preview: str = "",
@@ -14,13 +42,23 @@ def select(
     multi: bool = True,
     print_selection: bool = True,
     all: bool = False,
+    details: dict[str, str] | None = None,
 ) -> list[str]:
-    if not items:
+    items = iter(items)
+    if details:
+        # Shown next to each item, but only the item itself is matched and returned
+        items = (
+            f"{i}\t{Colors.DIM}{details[i]}{Colors.RESET}" if i in details else i for i in items
+        )
+    first = next(items, None)
+    if first is None:
         print_warning("Nothing available to select.")
         return []
 
     args = DEFAULT_FZF_CMD.copy()
     args += ["--header", header]
+    if details:
+        args += ["--delimiter", "\t", "--nth", "1"]
     if footer:
         args += ["--footer", footer]
     if bind:
@@ -32,19 +70,40 @@ def select(
     if preview:
         preview_path = PREVIEW_SCRIPTS / preview
         preview_cmd = str(preview_path) if preview_path.exists() else preview
-        if "{}" not in preview_cmd:
-            preview_cmd += " {}"
+        if "{}" not in preview_cmd and "{1}" not in preview_cmd:
+            preview_cmd += " {1}" if details else " {}"
         args += ["--preview", preview_cmd]
 
-    proc = subprocess.run(
-        args,
-        input="\n".join(items),
-        text=True,
-        capture_output=True,
-        env=environ | {"PKGS_DIR": PKGS_DIR},
-    )
+    env = environ | {"PKGS_DIR": PKGS_DIR, "ARF_DIFF_DIR": DIFF_DIR}
+    if preview == "package.sh" and PREVIEW_SERVER:
+        from arf.preview import preview_server
+
+        server = preview_server()
+    else:
+        server = nullcontext()
+
+    with server as socket_path, trace.span("fzf", header):
+        if socket_path:
+            env["ARF_PREVIEW_SOCKET"] = socket_path
+        proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            env=env,
+        )
+        # Stream items so fzf can draw the first ones while the rest are still produced
+        errors = []
+        writer = threading.Thread(target=_feed, args=(proc.stdin, first, items, errors))
+        writer.start()
+        output = proc.stdout.read()
+        proc.wait()
+        writer.join()
+    if errors:
+        raise errors[0]
 
-    selected = proc.stdout.strip().splitlines()
+    selected = [line.split("\t", 1)[0] for line in output.strip().splitlines()]
     if print_selection:
         if len(selected) > 0:
             print(f"{Colors.BOLD}Selected:{Colors.RESET}", " ".join(selected))
@@ -72,8 +131,8 @@ def provider_prompt(name: str, providers: list[str]) -> str | None:
     return select_one(providers, f"Select provider for {name}", preview="package.sh")
 
 
-def review_prompt(packages):
-    preview_cmd = f"{EDITOR} {PKGS_DIR}/{{}}/PKGBUILD"
+def review_prompt(packages, summaries=None):
+    preview_cmd = f"{EDITOR} {PKGS_DIR}/{{1}}/PKGBUILD"
     selected = select_one(
         packages,
         "Review build scripts",
@@ -81,5 +140,6 @@ def review_prompt(packages):
         preview="diff.sh",
         footer="Ctrl+e: Edit PKGBUILD",
         bind=f"ctrl-e:execute({preview_cmd})+refresh-preview",
+        details=summaries,
     )
     return selected is not None
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import time
+from arf import store
+from arf.config import FETCH_JOBS
+from arf.fetch import get_repo, prefetch_repos
+from arf.format import print_warning
+from arf.srcinfo_cache import read_srcinfo
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+LS_REMOTE_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vcs (
+    package TEXT NOT NULL,
+    url TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    commit_id TEXT NOT NULL,
+    built REAL NOT NULL,
+    PRIMARY KEY (package, url, ref)
+);
+"""
+
+
+class Source(NamedTuple):
+    directory: str
+    url: str
+    ref: str
+
+
+def git_sources(srcinfo: dict) -> list[Source]:
+    sources = []
+    for entry in srcinfo.get("source", []):
+        directory, sep, location = entry.partition("::")
+        if not sep:
+            directory, location = "", entry
+        if not location.startswith(("git+", "git://")):
+            continue
+        url, _, fragment = location.removeprefix("git+").partition("#")
+        url = url.split("?", 1)[0]
+        kind, _, value = fragment.split("?", 1)[0].partition("=")
+        if kind == "commit":
+            # Pinned sources cannot move upstream
+            continue
+        ref = {"branch": f"refs/heads/{value}", "tag": f"refs/tags/{value}"}.get(kind, "HEAD")
+        directory = directory or url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+        sources.append(Source(directory, url, ref))
+    return sources
+
+
+def remote_head(source: Source) -> str | None:
+    try:
+        proc = subprocess.run(
+            ["git", "ls-remote", "--", source.url, source.ref],
+            capture_output=True,
+            text=True,
+            timeout=LS_REMOTE_TIMEOUT,
+            # A moved or private upstream must not stop the check at a password prompt
+            env=os.environ | {"GIT_TERMINAL_PROMPT": "0"},
+        )
+    except subprocess.TimeoutExpired:
+        return None
+    for line in proc.stdout.splitlines():
+        commit, _, ref = line.partition("\t")
+        if ref == source.ref:
+            return commit
+    return None
+
+
+def built_head(repo: Path, source: Source) -> str | None:
+    # makepkg keeps a bare mirror of each git source in SRCDEST, the package directory by default
+    proc = subprocess.run(
+        ["git", f"--git-dir={repo / source.directory}", "rev-parse", "-q", "--verify", source.ref],
+        capture_output=True,
+        text=True,
+    )
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+def record(package: str, repo: Path, sources: list[Source]) -> None:
+    rows = []
+    for source in sources:
+        if commit := built_head(repo, source) or remote_head(source):
+            rows.append((package, source.url, source.ref, commit, time.time()))
+    db = store.connect(SCHEMA)
+    db.execute("DELETE FROM vcs WHERE package = ?", (package,))
+    db.executemany("INSERT INTO vcs VALUES (?, ?, ?, ?, ?)", rows)
+
+
+def recorded(package: str) -> dict[tuple[str, str], str]:
+    rows = store.connect(SCHEMA).execute(
+        "SELECT url, ref, commit_id FROM vcs WHERE package = ?", (package,)
+    )
+    return {(url, ref): commit for url, ref, commit in rows}
+
+
+def outdated(packages: list[str]) -> list[str]:
+    prefetch_repos(packages)
+    sources = {name: git_sources(read_srcinfo(name, get_repo(name))) for name in packages}
+    checks = {source for package_sources in sources.values() for source in package_sources}
+    with ThreadPoolExecutor(max_workers=FETCH_JOBS) as pool:
+        heads = dict(zip(checks, pool.map(remote_head, checks)))
+
+    updates = []
+    for name, package_sources in sources.items():
+        if not package_sources:
+            # Not a git source we can check, so keep rebuilding it as before
+            updates.append(name)
+            continue
+        built = recorded(name)
+        for source in package_sources:
+            head = heads[source]
+            if head is None:
+                print_warning(f"Could not check {source.url} for {name}")
+            elif built.get((source.url, source.ref)) != head:
+                updates.append(name)
+                break
+    return updates
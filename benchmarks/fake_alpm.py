@@ -0,0 +1,121 @@
+import re
+import sys
+import types
+from itertools import zip_longest
+
+PKG_REASON_EXPLICIT = 0
+PKG_REASON_DEPEND = 1
+
+
+def _segments(version: str) -> list[str]:
+    return re.findall(r"\d+|[a-zA-Z]+", version)
+
+
+def _compare(a: str, b: str) -> int:
+    for x, y in zip_longest(_segments(a), _segments(b)):
+        if x is None or y is None:
+            return -1 if x is None else 1
+        if x.isdigit() != y.isdigit():
+            return 1 if x.isdigit() else -1
+        if x.isdigit():
+            x, y = int(x), int(y)
+        if x != y:
+            return -1 if x < y else 1
+    return 0
+
+
+def _split(version: str) -> tuple[str, str, str | None]:
+    epoch, _, rest = version.rpartition(":")
+    ver, _, rel = rest.partition("-")
+    return epoch or "0", ver, rel or None
+
+
+def vercmp(a: str, b: str) -> int:
+    ea, va, ra = _split(a)
+    eb, vb, rb = _split(b)
+    # Like libalpm, the release is only compared when both sides have one
+    return _compare(ea, eb) or _compare(va, vb) or (_compare(ra, rb) if ra and rb else 0)
+
+
+class Package:
+    def __init__(self, name, version, db, depends=(), provides=(), optdepends=(), reason=0):
+        self.name = name
+        self.version = version
+        self.db = db
+        self.depends = list(depends)
+        self.provides = list(provides)
+        self.optdepends = list(optdepends)
+        self.reason = reason
+        self.desc = f"Synthetic package {name}"
+        self.arch = "x86_64"
+        self.url = "https://example.invalid"
+        self.licenses = ["MIT"]
+        self.groups = []
+        self.conflicts = []
+        self.replaces = []
+        self.size = 1 << 20
+        self.isize = 4 << 20
+        self.packager = "Benchmark <bench@example.invalid>"
+        self.builddate = 1_700_000_000
+
+
+class Database:
+    def __init__(self, name):
+        self.name = name
+        self.pkgcache = []
+        self._by_name = {}
+        self.groups = {}
+
+    def add(self, pkg):
+        self.pkgcache.append(pkg)
+        self._by_name[pkg.name] = pkg
+
+    def get_pkg(self, name):
+        return self._by_name.get(name)
+
+    def search(self, *patterns):
+        regexes = [re.compile(p) for p in patterns]
+        return [
+            pkg
+            for pkg in self.pkgcache
+            if all(r.search(pkg.name) or r.search(pkg.desc) for r in regexes)
+        ]
+
+    def read_grp(self, name):
+        if name in self.groups:
+            return name, [self._by_name[p] for p in self.groups[name]]
+        return None
+
+
+class Handle:
+    def __init__(self, localdb, syncdbs, dbpath):
+        self.localdb = localdb
+        self.syncdbs = syncdbs
+        self.dbpath = dbpath
+
+    def get_localdb(self):
+        return self.localdb
+
+    def get_syncdbs(self):
+        return self.syncdbs
+
+
+def install(handle: Handle) -> None:
+    pyalpm = types.ModuleType("pyalpm")
+    pyalpm.vercmp = vercmp
+    pyalpm.PKG_REASON_EXPLICIT = PKG_REASON_EXPLICIT
+    pyalpm.PKG_REASON_DEPEND = PKG_REASON_DEPEND
+
+    class PacmanConfig:
+        def __init__(self, conf=None):
+            pass
+
+        def initialize_alpm(self):
+            return handle
+
+    config = types.ModuleType("pycman.config")
+    config.PacmanConfig = PacmanConfig
+    pycman = types.ModuleType("pycman")
+    pycman.config = config
+
+    sys.modules.update({"pyalpm": pyalpm, "pycman": pycman, "pycman.config": config})
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCENARIOS = [
+    "startup",
+    "package-list",
+    "picker",
+    "preview",
+    "resolve",
+    "resolve-warm",
+    "resolve-mirror",
+    "update-check",
+    "update-check-mirror",
+]
+# Wall time budget for importing the CLI entry point, in milliseconds
+STARTUP_BUDGET = 150
+# Keystrokes simulated by the preview scenario
+PREVIEWS = 20
+
+
+def _first(name, choices):
+    return choices[0]
+
+
+def _setup(root: Path, size: int, fixture: Path | None):
+    from benchmarks import fake_alpm, universe
+    from benchmarks.stub_aur import StubAUR
+
+    if fixture:
+        records = json.loads(fixture.read_text())
+        records = records.get("results", records) if isinstance(records, dict) else records
+    else:
+        records = universe.synthetic_records(size)
+    repo_dir = root / "remote"
+    repo_dir.mkdir()
+    universe.build_repos(records, repo_dir)
+    fake_alpm.install(universe.build_handle(records, size, root / "db"))
+
+    stub = StubAUR(records, repo_dir).start()
+    os.environ["XDG_CACHE_HOME"] = str(root / "cache")
+    os.environ["ARF_AUR_URL"] = stub.url
+    os.environ["ARF_PREVIEW_SERVER"] = "0"
+    return stub, records
+
+
+def _startup():
+    times = []
+    for module in ("arf.cli", "arf.info", "arf.preview_client"):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        times.append((module, (time.perf_counter() - start) * 1000))
+    return {f"import {m} (ms)": round(t, 1) for m, t in times} | {
+        "within budget": all(t <= STARTUP_BUDGET for _, t in times)
+    }
+
+
+def child(scenario: str, size: int, fixture: Path | None) -> dict:
+    if scenario == "startup":
+        return _startup()
+
+    with tempfile.TemporaryDirectory(prefix="arf-bench-") as tmp:
+        stub, records = _setup(Path(tmp), size, fixture)
+        from arf import cli, fetch, main
+        from arf.alpm import get_alpm
+        from arf.resolve import Resolver
+
+        targets = [records[0]["Name"]]
+        if scenario != "package-list":
+            fetch.package_list()
+        if scenario.endswith("-mirror"):
+            fetch.download_metadata()
+        if scenario == "resolve-warm":
+            Resolver(get_alpm(), _first, lambda name, members: members).resolve(targets)
+
+        spawned = 0
+        popen_init = subprocess.Popen.__init__
+
+        def counting_init(self, *args, **kwargs):
+            nonlocal spawned
+            spawned += 1
+            popen_init(self, *args, **kwargs)
+
+        subprocess.Popen.__init__ = counting_init
+        rpc_before = stub.rpc_count
+        result = {}
+        start = time.perf_counter()
+
+        if scenario == "package-list":
+            index = fetch.package_list()
+            result["hits"] = sum(r["Name"] in index for r in records)
+        elif scenario == "picker":
+            result["items"] = sum(1 for _ in main.install_candidates(False, False))
+        elif scenario == "preview":
+            from arf.config import PREVIEW_SCRIPTS
+            from arf.preview import preview_server
+
+            names = [r["Name"] for r in records[:PREVIEWS]]
+            with preview_server() as socket_path:
+                env = os.environ | {"ARF_PREVIEW_SOCKET": socket_path}
+                for name in names:
+                    subprocess.run(
+                        ["sh", str(PREVIEW_SCRIPTS / "package.sh"), name],
+                        env=env,
+                        check=True,
+                        capture_output=True,
+                    )
+            result["previews"] = len(names)
+            result["per preview (ms)"] = round(
+                (time.perf_counter() - start) * 1000 / max(len(names), 1), 1
+            )
+        elif scenario.startswith("resolve"):
+            resolver = Resolver(get_alpm(), _first, lambda name, members: members)
+            resolved = resolver.resolve(targets)
+            result["aur"] = len(resolved.aur)
+            result["repo"] = len(resolved.pacman)
+        elif scenario.startswith("update-check"):
+            main.ui.select = lambda items, *args, **kwargs: []
+            # Parsed for real so the namespace keeps up with new options
+            sys.argv = ["arf", "update", "--aur-only"]
+            main.cmd_update(cli.parse_args())
+
+        elapsed = time.perf_counter() - start
+        subprocess.Popen.__init__ = popen_init
+        stub.shutdown()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return result | {
+        "wall (ms)": round(elapsed * 1000, 1),
+        "rpc": stub.rpc_count - rpc_before,
+        "subprocesses": spawned,
+        # ru_maxrss is in KiB on Linux
+        "peak rss (MiB)": round(usage.ru_maxrss / 1024, 1),
+        "peak child rss (MiB)": round(children.ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline arf benchmarks")
+    parser.add_argument("--size", type=int, action="append", help="AUR packages to generate")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("--fixture", type=Path, help="recorded RPC info results to serve")
+    parser.add_argument("--json", action="store_true", help="print raw results")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        size = args.size[0] if args.size else 0
+        print(json.dumps(child(args.child, size, args.fixture)))
+        return
+
+    results = []
+    for size in args.size or [100, 500]:
+        for scenario in args.scenario or SCENARIOS:
+            # One process per run keeps the peak RSS figures separate
+            command = [sys.executable, "-m", "benchmarks.run", "--child", scenario]
+            command += ["--size", str(size)]
+            if args.fixture:
+                command += ["--fixture", str(args.fixture)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results.append(
+                {"size": size, "scenario": scenario} | json.loads(output.splitlines()[-1])
+            )
+            if not args.json:
+                metrics = ", ".join(f"{k}={v}" for k, v in results[-1].items() if k != "scenario")
+                print(f"{scenario:<20} {metrics}", flush=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
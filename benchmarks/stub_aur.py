@@ -0,0 +1,73 @@
+import gzip
+import json
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubAUR(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, records: list[dict], repo_dir: Path):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.records = {r["Name"]: r for r in records}
+        self.provides = {}
+        for record in records:
+            for provide in record.get("Provides", []):
+                self.provides.setdefault(provide.split("=")[0], []).append(record)
+        self.package_list = gzip.compress("".join(f"{n}\n" for n in self.records).encode())
+        # Same layout as the AUR's dump, one record per line
+        dump = "[\n" + ",\n".join(json.dumps(r) for r in records) + "\n]\n"
+        self.metadata = gzip.compress(dump.encode())
+        self.repo_dir = repo_dir
+        self.rpc_count = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubAUR":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=str(args[2].repo_dir), **kwargs)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/packages.gz":
+            return self._send(self.server.package_list, "application/gzip")
+        if url.path == "/packages-meta-ext-v1.json.gz":
+            return self._send(self.server.metadata, "application/gzip")
+        if not url.path.startswith("/rpc/"):
+            # Dumb-HTTP git clones of the synthetic repos
+            return super().do_GET()
+
+        with self.server.lock:
+            self.server.rpc_count += 1
+        if url.path.endswith("/info"):
+            names = query.get("arg[]", []) + query.get("arg", [])
+            results = [self.server.records[n] for n in names if n in self.server.records]
+        elif query.get("by") == ["provides"]:
+            results = self.server.provides.get(query["arg"][0], [])
+        else:
+            arg = query.get("arg", [""])[0]
+            results = [r for n, r in self.server.records.items() if arg in n]
+        body = {"version": 5, "type": "multiinfo", "resultcount": len(results), "results": results}
+        self._send(json.dumps(body).encode(), "application/json")
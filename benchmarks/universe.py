@@ -0,0 +1,118 @@
+import random
+import subprocess
+from benchmarks.fake_alpm import PKG_REASON_DEPEND, PKG_REASON_EXPLICIT, Database, Handle, Package
+from pathlib import Path
+
+
+def synthetic_records(size: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    records = []
+    for i in range(size):
+        later = range(i + 1, min(size, i + 12))
+        depends = []
+        for j in rng.sample(later, min(3, len(later))):
+            # Mix plain, versioned and virtual AUR dependencies
+            depends.append(rng.choice([f"aur{j}", f"aur{j}>=1.0", f"aurvirt{j}"]))
+        depends += [f"lib{rng.randrange(size * 4)}" for _ in range(2)]
+        if i % 7 == 0:
+            depends.append(f"libvirt{rng.randrange(size * 4) // 10 * 10}.so")
+        records.append(
+            {
+                "Name": f"aur{i}",
+                "PackageBase": f"aur{i}",
+                "Version": f"1.{i}-1",
+                "Description": f"Synthetic AUR package {i}",
+                "URL": "https://example.invalid",
+                "Depends": depends,
+                "MakeDepends": ["git"],
+                "Provides": [f"aurvirt{i}"],
+                "License": ["MIT"],
+                "Maintainer": "bench",
+                "NumVotes": i,
+                "Popularity": 0.1,
+                "FirstSubmitted": 1_600_000_000,
+                "LastModified": 1_700_000_000,
+                "OutOfDate": None,
+            }
+        )
+    return records
+
+
+def build_handle(records: list[dict], size: int, dbpath: Path, seed: int = 0) -> Handle:
+    rng = random.Random(seed)
+    sync = Database("core")
+    local = Database("local")
+    names = [f"lib{i}" for i in range(size * 4)] + ["git"]
+    for i, name in enumerate(names):
+        deps = [f"lib{j}" for j in rng.sample(range(i), min(2, i))] if name != "git" else []
+        provides = [f"libvirt{i}.so=1-64"] if i % 10 == 0 else []
+        sync.add(Package(name, "1.0-1", sync, depends=deps, provides=provides))
+        if rng.random() < 0.5:
+            local.add(
+                Package(
+                    name, "1.0-1", local, depends=deps, provides=provides, reason=PKG_REASON_DEPEND
+                )
+            )
+
+    # Half of the AUR set is installed, and half of that is outdated
+    for i, record in enumerate(records):
+        if i % 2:
+            continue
+        version = record["Version"]
+        if i % 4 == 0:
+            version = version.rsplit("-", 1)[0] + "-0"
+        local.add(
+            Package(
+                record["Name"],
+                version,
+                local,
+                depends=record["Depends"],
+                reason=PKG_REASON_EXPLICIT,
+            )
+        )
+
+    sync_dir = dbpath / "sync"
+    sync_dir.mkdir(parents=True, exist_ok=True)
+    (sync_dir / "core.db").touch()
+    return Handle(local, [sync], str(dbpath))
+
+
+def srcinfo(record: dict) -> str:
+    pkgver, pkgrel = record["Version"].rsplit("-", 1)
+    lines = [
+        f"pkgbase = {record['PackageBase']}",
+        f"\tpkgdesc = {record['Description']}",
+        f"\tpkgver = {pkgver}",
+        f"\tpkgrel = {pkgrel}",
+        "\tarch = any",
+    ]
+    for field in ("Depends", "MakeDepends", "Provides"):
+        lines += [f"\t{field.lower()} = {value}" for value in record.get(field, [])]
+    lines += ["", f"pkgname = {record['Name']}", ""]
+    return "\n".join(lines)
+
+
+def build_repos(records: list[dict], repo_dir: Path) -> None:
+    for record in records:
+        repo = repo_dir / f"{record['Name']}.git"
+        subprocess.run(["git", "init", "-q", "--bare", str(repo)], check=True)
+        files = {
+            "PKGBUILD": f"pkgname={record['Name']}\npkgver={record['Version']}\n",
+            ".SRCINFO": srcinfo(record),
+        }
+        stream = [
+            "commit refs/heads/master",
+            "committer bench <bench@example.invalid> 1700000000 +0000",
+        ]
+        stream += ["data 6", "import"]
+        for path, content in files.items():
+            data = content.encode()
+            stream += [f"M 100644 inline {path}", f"data {len(data)}", content]
+        subprocess.run(
+            ["git", "fast-import", "--quiet"],
+            cwd=repo,
+            input="\n".join(stream) + "\n",
+            text=True,
+            check=True,
+        )
+        subprocess.run(["git", "update-server-info"], cwd=repo, check=True)
@@ -0,0 +1,26 @@
+import atexit
+import os
+import pytest
+import shutil
+import tempfile
+from benchmarks import fake_alpm
+from benchmarks.fake_alpm import Database, Handle
+from types import SimpleNamespace
+
+# arf.config reads the cache location on import, so it is set before anything imports arf
+os.environ["XDG_CACHE_HOME"] = cache_home = tempfile.mkdtemp(prefix="arf-test-")
+atexit.register(shutil.rmtree, cache_home, ignore_errors=True)
+fake_alpm.install(None)
+
+
+@pytest.fixture
+def make_alpm(monkeypatch, tmp_path):
+    from arf import alpm
+
+    def make(sync: Database, local: Database | None = None) -> alpm.Alpm:
+        handle = Handle(local or Database("local"), [sync], str(tmp_path))
+        config = SimpleNamespace(initialize_alpm=lambda: handle)
+        monkeypatch.setattr(alpm, "PacmanConfig", lambda conf: config)
+        return alpm.Alpm()
+
+    return make
@@ -0,0 +1,76 @@
+import gzip
+import json
+import pytest
+from arf import fetch, mirror
+from arf.fetch import _json_array
+from arf.resolve import Resolver
+from benchmarks.fake_alpm import Database, Package
+from pathlib import Path
+
+DUMP = Path(__file__).parent / "fixtures" / "packages-meta-ext-v1.json"
+
+
+def chunked(data: bytes, size: int) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.fixture
+def dump() -> bytes:
+    return DUMP.read_bytes()
+
+
+@pytest.fixture
+def mirrored(dump, monkeypatch):
+    records = json.loads(dump)
+    mirror.replace(_json_array([gzip.compress(dump)]), {"etag": "fixture"})
+    monkeypatch.setattr(fetch, "package_list", lambda: {r["Name"] for r in records})
+    yield records
+    mirror.clear()
+
+
+# Stored blocks keep the compressed chunks aligned with the text, so small chunks split
+# multi-byte characters and records
+@pytest.mark.parametrize("size", [1, 7, 64, 1 << 20])
+def test_json_array_across_chunk_boundaries(dump, size):
+    chunks = chunked(gzip.compress(dump, compresslevel=0), size)
+    assert list(_json_array(chunks)) == json.loads(dump)
+
+
+def test_json_array_rejects_a_record_cut_in_half(dump):
+    data = gzip.compress(dump)
+    with pytest.raises(ValueError):
+        list(_json_array([data[: len(data) // 2]]))
+
+
+def test_json_array_rejects_a_dump_cut_between_records(dump):
+    # A valid gzip stream of the first two records, without the end of the stream
+    end = dump.index(b"},\n", dump.index(b"},\n") + 1) + 3
+    compressor = gzip.zlib.compressobj(wbits=31)
+    data = compressor.compress(dump[:end]) + compressor.flush(gzip.zlib.Z_SYNC_FLUSH)
+    with pytest.raises(ValueError):
+        list(_json_array([data]))
+
+
+def test_mirror_info_and_providers(mirrored):
+    assert mirror.enabled()
+    assert mirror.meta() == {"etag": "fixture"}
+    assert set(mirror.info(["foo", "bar", "missing"])) == {"foo", "bar"}
+    assert mirror.record("qux")["Description"].startswith("Ünïcödé")
+    assert sorted(r["Name"] for r in mirror.providers("baz-virt")) == ["baz-git", "qux"]
+    assert [r["Name"] for r in mirror.providers("bar-compat")] == ["bar"]
+    assert mirror.providers("missing") == []
+
+
+def test_resolve_from_the_mirror(mirrored, make_alpm, monkeypatch):
+    monkeypatch.setattr(fetch, "get_repo", pytest.fail)
+    core = Database("core")
+    for name in ("libfoo", "git"):
+        core.add(Package(name, "1.0-1", core))
+    resolver = Resolver(make_alpm(core), lambda name, providers: providers[0], None)
+
+    resolved = resolver.resolve(["foo"])
+
+    assert [pkg["name"] for pkg in resolved.aur] == ["bar", "baz-git", "foo"]
+    assert {pkg["name"] for pkg in resolved.pacman} == {"git", "libfoo"}
+    assert resolved.graph["foo"] == {"bar", "baz-git", "libfoo"}
+    assert [pkg["dependency"] for pkg in resolved.aur] == [True, True, False]
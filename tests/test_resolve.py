@@ -0,0 +1,48 @@
+import pytest
+from arf import fetch
+from arf.resolve import Resolver
+from benchmarks.fake_alpm import Database, Package
+
+
+def first(name, providers):
+    return providers[0]
+
+
+@pytest.fixture(autouse=True)
+def no_aur(monkeypatch):
+    monkeypatch.setattr(fetch, "package_list", lambda: set())
+
+
+def repo(*packages):
+    db = Database("core")
+    for name, depends, provides in packages:
+        db.add(Package(name, "1.0-1", db, depends=depends, provides=provides))
+    return db
+
+
+@pytest.mark.parametrize("targets", [["x", "y"], ["y", "x"]])
+def test_provider_satisfies_every_constraint_in_a_level(make_alpm, targets):
+    alpm = make_alpm(
+        repo(
+            ("x", ["virt>=2"], []),
+            ("y", ["virt"], []),
+            ("p0", [], ["virt"]),
+            ("p1", [], ["virt=3"]),
+        )
+    )
+    resolved = Resolver(alpm, first, lambda name, members: members).resolve(targets)
+    assert {pkg["name"] for pkg in resolved.pacman} == {"x", "y", "p1"}
+
+
+def test_cached_provider_is_replaced_when_a_later_constraint_rejects_it(make_alpm):
+    alpm = make_alpm(
+        repo(
+            ("a", ["virt", "z"], []),
+            ("z", ["virt>=2"], []),
+            ("p0", [], ["virt"]),
+            ("p1", [], ["virt=3"]),
+        )
+    )
+    resolved = Resolver(alpm, first, lambda name, members: members).resolve(["a"])
+    assert resolved.graph["a"] == {"p0", "z"}
+    assert resolved.graph["z"] == {"p1"}
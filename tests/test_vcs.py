@@ -0,0 +1,68 @@
+import subprocess
+from arf import vcs
+from pathlib import Path
+
+SRCINFO = """pkgbase = foo-git
+\tpkgver = r1.0000000
+\tpkgrel = 1
+\tarch = any
+\tsource = foo::git+{url}#branch=main
+
+pkgname = foo-git
+"""
+
+
+def git(*args, cwd=None):
+    subprocess.run(
+        ["git", "-c", "user.name=arf", "-c", "user.email=arf@example.invalid", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def push_commit(work: Path, message: str) -> None:
+    (work / "file").write_text(message)
+    git("add", "file", cwd=work)
+    git("commit", "-q", "-m", message, cwd=work)
+    git("push", "-q", "origin", "HEAD:main", cwd=work)
+
+
+def test_git_sources():
+    sources = vcs.git_sources(
+        {
+            "source": [
+                "git+https://example.invalid/a.git",
+                "b::git+https://example.invalid/b#branch=dev",
+                "git://example.invalid/c.git#tag=v1?signed",
+                "git+https://example.invalid/d#commit=0123abc",
+                "https://example.invalid/e.tar.gz",
+            ]
+        }
+    )
+    assert sources == [
+        vcs.Source("a", "https://example.invalid/a.git", "HEAD"),
+        vcs.Source("b", "https://example.invalid/b", "refs/heads/dev"),
+        vcs.Source("c", "git://example.invalid/c.git", "refs/tags/v1"),
+    ]
+
+
+def test_outdated_follows_the_upstream_head(tmp_path, monkeypatch):
+    upstream = tmp_path / "upstream.git"
+    work = tmp_path / "work"
+    git("init", "-q", "--bare", str(upstream))
+    git("clone", "-q", str(upstream), str(work))
+    push_commit(work, "first")
+
+    repo = tmp_path / "foo-git"
+    repo.mkdir()
+    (repo / ".SRCINFO").write_text(SRCINFO.format(url=f"file://{upstream}"))
+    monkeypatch.setattr(vcs, "prefetch_repos", lambda names: None)
+    monkeypatch.setattr(vcs, "get_repo", lambda name: repo)
+
+    # No bare mirror in the package directory, so the recorded head comes from ls-remote
+    vcs.record("foo-git", repo, vcs.git_sources(vcs.read_srcinfo("foo-git", repo)))
+    assert vcs.outdated(["foo-git"]) == []
+
+    push_commit(work, "second")
+    assert vcs.outdated(["foo-git"]) == ["foo-git"]